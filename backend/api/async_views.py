@@ -0,0 +1,49 @@
+from contextlib import nullcontext
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections, connection
+from django.urls import re_path
+from rest_framework.permissions import SAFE_METHODS
+
+
+def call_view(view, request, *args, **kwargs):
+    close_old_connections()
+    timer = getattr(request, 'query_timer', None)
+    try:
+        with connection.execute_wrapper(timer) if timer else nullcontext():
+            response = view(request, *args, **kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def as_async(view):
+    """Async version of a sync view for ASGI deployments.
+
+    Django 3.2 has no async ORM and runs sync views of all requests in a
+    single thread under ASGI. Reads of the wrapped view run in the
+    thread pool of the event loop instead, each thread with its own
+    connection, so requests wait for the database concurrently. Writes
+    stay in the thread of the sync views, like without the wrapper.
+    """
+
+    @wraps(view)
+    async def async_view(request, *args, **kwargs):
+        return await sync_to_async(
+            call_view, thread_sensitive=request.method not in SAFE_METHODS
+        )(view, request, *args, **kwargs)
+
+    return async_view
+
+
+def get_async_urls(router, names):
+    """Url patterns of the router with the views of ``names`` wrapped by
+    ``as_async``, to be placed before the router urls.
+    """
+    return [
+        re_path(str(url.pattern), as_async(url.callback), name=url.name)
+        for url in router.urls if url.name in names
+    ]
@@ -0,0 +1,43 @@
+from hashlib import sha256
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+
+TOKEN_KEY = 'auth_token:{}'
+
+
+def get_token_cache():
+    return caches[settings.TOKEN_CACHE_ALIAS]
+
+
+def get_cache_key(key):
+    return TOKEN_KEY.format(sha256(key.encode()).hexdigest())
+
+
+def forget_tokens(keys):
+    get_token_cache().delete_many([get_cache_key(key) for key in keys])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication with token -> user kept in a shared cache.
+
+    Entries live for TOKEN_CACHE_TTL seconds in a cache bounded by
+    TOKEN_CACHE_SIZE and are dropped by signals on logout, token
+    changes and every save of the user (password change, deactivation).
+    """
+
+    def authenticate_credentials(self, key):
+        cache = get_token_cache()
+        cache_key = get_cache_key(key)
+        user = cache.get(cache_key)
+        if user is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set(cache_key, user, timeout=settings.TOKEN_CACHE_TTL)
+            return user, token
+        if not user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        return user, self.get_model()(key=key, user=user)
@@ -0,0 +1,104 @@
+import gzip
+import re
+from threading import Lock
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.renderers import JSONRenderer
+
+from dish.models import Tag
+
+
+GZIP_RE = re.compile(r'\bgzip\b')
+JSON_CONTENT_TYPE = 'application/json'
+VERSION_KEY = 'catalogue_version:{}'
+
+
+def get_version(name):
+    """Version of a catalogue shared by all workers through the cache."""
+    key = VERSION_KEY.format(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(name):
+    cache.set(VERSION_KEY.format(name), uuid4().hex, timeout=None)
+
+
+class CatalogueCache:
+    """Serialized catalogue payloads of the current worker."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._payloads = {}
+
+    def get(self, name, get_data):
+        version = get_version(name)
+        payload = self._payloads.get(name)
+        if payload is None or payload[0] != version:
+            raw = JSONRenderer().render(get_data())
+            payload = (version, raw, gzip.compress(raw))
+            with self._lock:
+                self._payloads[name] = payload
+        return payload[1:]
+
+
+catalogue_cache = CatalogueCache()
+
+
+class CachedListMixin:
+    """Serves the unfiltered list from the catalogue cache as JSON."""
+
+    catalogue_name = None
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params or request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+        raw, compressed = catalogue_cache.get(
+            self.catalogue_name,
+            lambda: self.get_serializer(self.get_queryset(), many=True).data
+        )
+        accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if GZIP_RE.search(accept_encoding):
+            response = HttpResponse(compressed, content_type=JSON_CONTENT_TYPE)
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(raw, content_type=JSON_CONTENT_TYPE)
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+
+class TagSlugMap:
+    """Process-local map of lowercased tag slugs to ids.
+
+    Replaces the tag lookup of every filtered request; the map is
+    reloaded when the shared tags version changes.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._version = None
+        self._ids = None
+
+    def get_map(self):
+        version = get_version('tags')
+        with self._lock:
+            if self._ids is None or self._version != version:
+                self._ids = {
+                    slug.lower(): id
+                    for id, slug in Tag.objects.values_list('id', 'slug')
+                }
+                self._version = version
+            return self._ids
+
+    def get_ids(self, slugs):
+        ids = self.get_map()
+        return sorted({ids[slug.lower()] for slug in slugs})
+
+
+tag_slug_map = TagSlugMap()
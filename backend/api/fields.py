@@ -1,15 +1,53 @@
 import base64
+import binascii
 
+from django.conf import settings
 from django.core.files.base import ContentFile
 from rest_framework import serializers
 
+from .images import get_rendition_urls
+
 
 class Base64ImageField(serializers.ImageField):
+    default_error_messages = {
+        'too_large': 'Размер изображения не должен превышать {max_size} байт.',
+        'invalid_base64': 'Некорректная строка base64.',
+    }
+
     def to_internal_value(self, data):
 
         if isinstance(data, str) and data.startswith('data:image'):
             format, imgstr = data.split(';base64,')
             ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            max_size = settings.IMAGE_MAX_UPLOAD_SIZE
+            if len(imgstr) * 3 // 4 > max_size:
+                self.fail('too_large', max_size=max_size)
+            try:
+                decoded = base64.b64decode(imgstr, validate=True)
+            except binascii.Error:
+                self.fail('invalid_base64')
+            data = ContentFile(decoded, name='temp.' + ext)
 
         return super().to_internal_value(data)
+
+
+class ImageRenditionsField(serializers.Field):
+    """Urls of resized copies of an image, by rendition name.
+
+    Renditions are made in the background, so the urls are left out
+    until all of them are saved. The readiness comes from the
+    ``renditions_ready`` annotation of the recipe when there is one.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, image):
+        if not image:
+            return {}
+        return get_rendition_urls(
+            image.name,
+            self.context.get('request'),
+            getattr(image.instance, 'renditions_ready', None)
+        )
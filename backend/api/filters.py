@@ -1,21 +1,49 @@
-from django_filters import FilterSet, ModelMultipleChoiceFilter, NumberFilter
+from django import forms
+from django_filters import CharFilter, Filter, FilterSet, NumberFilter
 from django.contrib.auth import get_user_model
+from django.db.models import (
+    BooleanField,
+    Case,
+    Exists,
+    OuterRef,
+    Value,
+    When
+)
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.settings import api_settings
 
-from dish.models import Recipe, Tag
+from dish.models import Recipe, RecipeTag
+from dish.search import search_recipes
+from .cache import tag_slug_map
 
 
 User = get_user_model()
 
 
+class TagSlugsField(forms.MultipleChoiceField):
+
+    def valid_value(self, value):
+        return value.lower() in tag_slug_map.get_map()
+
+
+class TagsFilter(Filter):
+    """Recipes having any of the tags, without joins and duplicates."""
+
+    field_class = TagSlugsField
+
+    def filter(self, queryset, value):
+        if not value:
+            return queryset
+        return queryset.filter(Exists(RecipeTag.objects.filter(
+            recipe=OuterRef('pk'), tag_id__in=tag_slug_map.get_ids(value)
+        )))
+
+
 class CustomRecipeFilter(FilterSet):
-    tags = ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        lookup_expr='iexact',
-        queryset=Tag.objects.all()
-    )
+    tags = TagsFilter()
     is_favorited = NumberFilter(method='filter_is_favorited')
     is_in_shopping_cart = NumberFilter(method='filter_is_in_shopping_cart')
+    search = CharFilter(method='filter_search')
 
     def filter_is_favorited(self, queryset, name, value):
         if self.request.user.is_authenticated and value == 1:
@@ -27,6 +55,38 @@ class CustomRecipeFilter(FilterSet):
             return queryset.filter(shoppingcart__user=self.request.user)
         return queryset
 
+    def filter_search(self, queryset, name, value):
+        if value.strip():
+            return search_recipes(queryset, value.strip())
+        return queryset
+
     class Meta:
         model = Recipe
         fields = ('author', 'tags')
+
+
+class IngredientSearchFilter(BaseFilterBackend):
+    """Prefix hits first, then substring hits, optionally limited."""
+
+    def filter_queryset(self, request, queryset, view):
+        name = request.query_params.get(api_settings.SEARCH_PARAM)
+        if name:
+            queryset = queryset.filter(name__icontains=name).annotate(
+                is_prefix=Case(
+                    When(name__istartswith=name, then=Value(True)),
+                    default=Value(False),
+                    output_field=BooleanField()
+                )
+            ).order_by('-is_prefix', 'name')
+        # A sliced queryset can not be filtered by pk for a detail view.
+        limit = get_limit(request)
+        if limit is not None and getattr(view, 'action', None) == 'list':
+            queryset = queryset[:limit]
+        return queryset
+
+
+def get_limit(request):
+    limit = request.query_params.get('limit', '')
+    if limit.isdigit() and int(limit) > 0:
+        return int(limit)
+    return None
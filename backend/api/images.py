@@ -0,0 +1,166 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+from threading import BoundedSemaphore
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections
+from PIL import Image
+
+from dish.models import StoredImage
+from dish.storage import IMAGES_DIR
+
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS_DIR = 'renditions'
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_RENDITION_WORKERS,
+    thread_name_prefix='image-renditions'
+)
+# The executor queue has no limit, so uploads over these slots are left
+# to make_image_renditions instead of piling up work in memory.
+queue_slots = BoundedSemaphore(settings.IMAGE_RENDITION_QUEUE_SIZE)
+
+
+def get_rendition_name(name, size_name, extension):
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return f'{RENDITIONS_DIR}/{stem}_{size_name}.{extension}'
+
+
+def get_rendition_names(name):
+    extension = os.path.splitext(name)[1].lstrip('.').lower()
+    for size_name in settings.IMAGE_RENDITIONS:
+        yield size_name, get_rendition_name(name, size_name, extension)
+        yield (
+            f'{size_name}_webp',
+            get_rendition_name(name, size_name, 'webp')
+        )
+
+
+def is_stored_image(name):
+    return name.startswith(f'{IMAGES_DIR}/')
+
+
+@lru_cache(maxsize=10000)
+def has_renditions(name):
+    return all(
+        default_storage.exists(rendition_name)
+        for _, rendition_name in get_rendition_names(name)
+    )
+
+
+def renditions_ready(name, ready=None):
+    """Whether all renditions of the image are saved.
+
+    ``ready`` is the flag of the stored image when the recipe query
+    annotated it, see ``RecipeQuerySet.with_renditions_ready``. Images
+    saved before the content-addressed storage have no flag; they are
+    checked once per process.
+    """
+    if not is_stored_image(name):
+        return has_renditions(name)
+    if ready is None:
+        ready = StoredImage.objects.filter(
+            name=name, renditions_ready=True
+        ).exists()
+    return ready
+
+
+def get_rendition_urls(name, request=None, ready=None):
+    """Urls of the renditions of an image, empty until all of them are
+    saved; the urls are derived from the name without touching the
+    storage.
+    """
+    renditions = {}
+    if not name or not renditions_ready(name, ready):
+        return renditions
+    for rendition, rendition_name in get_rendition_names(name):
+        url = default_storage.url(rendition_name)
+        if request is not None:
+            url = request.build_absolute_uri(url)
+        renditions[rendition] = url
+    return renditions
+
+
+def save_rendition(image, name, image_format):
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, format=image_format)
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def make_renditions(name):
+    """Saves the renditions of an image and marks them ready."""
+    # Stored images never change, so existing renditions are up to date.
+    if not has_renditions.__wrapped__(name):
+        save_renditions(name)
+    if is_stored_image(name):
+        StoredImage.objects.filter(name=name).update(renditions_ready=True)
+    else:
+        has_renditions.cache_clear()
+
+
+def save_renditions(name):
+    with default_storage.open(name) as image_file:
+        image = Image.open(image_file)
+        image.load()
+    image_format = image.format or 'PNG'
+    extension = os.path.splitext(name)[1].lstrip('.').lower()
+    for size_name, size in settings.IMAGE_RENDITIONS.items():
+        thumbnail = image.copy()
+        thumbnail.thumbnail(size)
+        save_rendition(
+            thumbnail,
+            get_rendition_name(name, size_name, extension),
+            image_format
+        )
+        save_rendition(
+            thumbnail, get_rendition_name(name, size_name, 'webp'), 'WEBP'
+        )
+
+
+def delete_image(name):
+    """Deletes an image together with its renditions."""
+    for _, rendition_name in get_rendition_names(name):
+        default_storage.delete(rendition_name)
+    default_storage.delete(name)
+
+
+def run_renditions(name):
+    try:
+        make_renditions(name)
+    finally:
+        connections.close_all()
+
+
+def finish_renditions(future):
+    queue_slots.release()
+    if future.exception() is not None:
+        logger.error(
+            'Image renditions failed', exc_info=future.exception()
+        )
+
+
+def schedule_renditions(name):
+    """Makes the renditions in the background. When the queue is full,
+    the upload does not wait: the image stays without renditions until
+    the make_image_renditions command makes them.
+    """
+    if not queue_slots.acquire(blocking=False):
+        logger.warning('Image renditions queue is full, skipped %s', name)
+        return
+    try:
+        future = executor.submit(run_renditions, name)
+    except RuntimeError:
+        queue_slots.release()
+        raise
+    future.add_done_callback(finish_renditions)
@@ -0,0 +1,127 @@
+import json
+import statistics
+import time
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from dish.models import Ingredient, Recipe, Tag
+
+
+User = get_user_model()
+
+
+def get_routes(user, recipe, tag, ingredient):
+    author = recipe.author_id
+    return (
+        ('tags_list', '/api/tags/'),
+        ('tags_detail', f'/api/tags/{tag.id}/'),
+        ('ingredients_list', '/api/ingredients/'),
+        ('ingredients_search', '/api/ingredients/?name=абр'),
+        ('ingredients_search_limit', '/api/ingredients/?name=абр&limit=10'),
+        ('ingredients_detail', f'/api/ingredients/{ingredient.id}/'),
+        ('recipes_list', '/api/recipes/'),
+        ('recipes_list_limit_50', '/api/recipes/?limit=50'),
+        ('recipes_list_page_100', '/api/recipes/?page=100'),
+        ('recipes_list_cursor', '/api/recipes/?cursor=&limit=50'),
+        ('recipes_filter_author', f'/api/recipes/?author={author}'),
+        ('recipes_filter_tags', f'/api/recipes/?tags={tag.slug}'),
+        ('recipes_filter_favorited', '/api/recipes/?is_favorited=1'),
+        ('recipes_filter_cart', '/api/recipes/?is_in_shopping_cart=1'),
+        ('recipes_feed', '/api/recipes/feed/?limit=50'),
+        ('recipes_detail', f'/api/recipes/{recipe.id}/'),
+        ('download_shopping_cart', '/api/recipes/download_shopping_cart/'),
+        ('users_list', '/api/users/'),
+        ('users_detail', f'/api/users/{author}/'),
+        ('users_me', '/api/users/me/'),
+        ('subscriptions', '/api/users/subscriptions/?recipes_limit=3'),
+        (
+            'subscriptions_limit_50',
+            '/api/users/subscriptions/?limit=50&recipes_limit=3'
+        ),
+    )
+
+
+class Command(BaseCommand):
+    help = 'measures latency and query counts of api routes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument('--output', default='benchmark.json')
+        parser.add_argument(
+            '--baseline', help='previous report to print the difference with'
+        )
+
+    def handle(self, *args, **options):
+        user = User.objects.annotate(
+            follows=Count('followed_users')
+        ).order_by('-follows').first()
+        recipe = Recipe.objects.order_by('?').first()
+        tag = Tag.objects.first()
+        ingredient = Ingredient.objects.first()
+        if None in (user, recipe, tag, ingredient):
+            raise CommandError(
+                'Database is empty, run generate_benchmark_data first.'
+            )
+        client = APIClient()
+        client.force_authenticate(user)
+        results = {}
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for name, url in get_routes(user, recipe, tag, ingredient):
+                results[name] = self.measure(client, url, options['repeat'])
+                self.stdout.write(
+                    f'{name:28} {results[name]["median_ms"]:9.2f} ms '
+                    f'{results[name]["queries"]:4} queries'
+                )
+        report = {
+            'database': connection.vendor,
+            'django': django.get_version(),
+            'repeat': options['repeat'],
+            'rows': {
+                'users': User.objects.count(),
+                'recipes': Recipe.objects.count(),
+                'ingredients': Ingredient.objects.count(),
+            },
+            'results': results,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            json.dump(report, output, ensure_ascii=False, indent=2)
+        if options['baseline']:
+            self.compare(options['baseline'], results)
+
+    def measure(self, client, url, repeat):
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = client.get(url)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        return {
+            'url': url,
+            'status': response.status_code,
+            'queries': len(queries),
+            'median_ms': round(statistics.median(timings), 3),
+            'p95_ms': round(timings[int(len(timings) * 0.95) - 1], 3),
+            'min_ms': round(timings[0], 3),
+        }
+
+    def compare(self, path, results):
+        with open(path, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        self.stdout.write(f'\n{"route":28} {"median Δ":>9} {"queries Δ":>9}')
+        for name, result in results.items():
+            if name not in baseline:
+                continue
+            self.stdout.write(
+                f'{name:28} '
+                f'{result["median_ms"] - baseline[name]["median_ms"]:+9.2f} '
+                f'{result["queries"] - baseline[name]["queries"]:+9}'
+            )
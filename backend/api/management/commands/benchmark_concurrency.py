@@ -0,0 +1,135 @@
+import asyncio
+import json
+import statistics
+from itertools import cycle
+from urllib.parse import quote, urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+DEFAULT_PATHS = (
+    '/api/recipes/',
+    '/api/recipes/?limit=50',
+    '/api/ingredients/?name=абр',
+    '/api/tags/',
+)
+
+
+class Target:
+
+    def __init__(self, value):
+        name, _, url = value.partition('=')
+        parts = urlsplit(url)
+        if not name or not parts.hostname:
+            raise CommandError(f'Expected name=url, got {value!r}.')
+        self.name = name
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.netloc = parts.netloc
+
+
+async def fetch(target, path, headers):
+    reader, writer = await asyncio.open_connection(target.host, target.port)
+    path = quote(path, safe='/?=&%')
+    try:
+        writer.write((
+            f'GET {path} HTTP/1.1\r\nHost: {target.netloc}\r\n'
+            f'{headers}Connection: close\r\n\r\n'
+        ).encode())
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    return int(response.split(b' ', 2)[1])
+
+
+async def run_client(target, paths, headers, deadline, latencies, errors):
+    loop = asyncio.get_running_loop()
+    while loop.time() < deadline:
+        started = loop.time()
+        try:
+            status = await fetch(target, next(paths), headers)
+        except (OSError, IndexError, ValueError):
+            status = None
+        if status is None or status >= 400:
+            errors.append(status)
+        else:
+            latencies.append(loop.time() - started)
+
+
+async def run_level(target, paths, headers, concurrency, duration):
+    loop = asyncio.get_running_loop()
+    latencies, errors = [], []
+    started = loop.time()
+    offsets = (client % len(paths) for client in range(concurrency))
+    await asyncio.gather(*(
+        run_client(
+            target, cycle(paths[offset:] + paths[:offset]), headers,
+            started + duration, latencies, errors
+        ) for offset in offsets
+    ))
+    elapsed = loop.time() - started
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'rps': round(len(latencies) / elapsed, 1),
+        'median_ms': round(statistics.median(latencies) * 1000, 1)
+        if latencies else None,
+        'p95_ms': round(latencies[int(len(latencies) * 0.95)] * 1000, 1)
+        if latencies else None,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'measures requests per second of running servers, for example '
+        'WSGI and ASGI deployments, at several concurrency levels'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target', action='append', required=True,
+            help='name=url of a running server, can be repeated'
+        )
+        parser.add_argument(
+            '--path', action='append', help='request path, can be repeated'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, nargs='+', default=[100, 500]
+        )
+        parser.add_argument(
+            '--duration', type=float, default=10, help='seconds per level'
+        )
+        parser.add_argument('--token', help='auth token of the clients')
+        parser.add_argument('--output', default='concurrency.json')
+
+    def handle(self, *args, **options):
+        targets = [Target(value) for value in options['target']]
+        paths = tuple(options['path'] or DEFAULT_PATHS)
+        headers = (
+            f'Authorization: Token {options["token"]}\r\n'
+            if options['token'] else ''
+        )
+        results = {}
+        self.stdout.write(
+            f'{"target":12} {"clients":>7} {"rps":>9} {"median":>9} '
+            f'{"p95":>9} {"errors":>7}'
+        )
+        for concurrency in options['concurrency']:
+            for target in targets:
+                result = asyncio.run(run_level(
+                    target, paths, headers, concurrency, options['duration']
+                ))
+                results.setdefault(target.name, {})[concurrency] = result
+                self.stdout.write(
+                    f'{target.name:12} {concurrency:7} {result["rps"]:9} '
+                    f'{result["median_ms"]!s:>9} {result["p95_ms"]!s:>9} '
+                    f'{result["errors"]:7}'
+                )
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            json.dump({
+                'paths': paths,
+                'duration': options['duration'],
+                'results': results,
+            }, output, ensure_ascii=False, indent=2)
@@ -0,0 +1,94 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from rest_framework.renderers import JSONRenderer
+
+from api.renderers import ORJSONRenderer
+from api.serializers import ReadRecipeSerializer, RecipeListSerializer
+from dish.models import Recipe
+
+
+User = get_user_model()
+
+
+def serialize_models(queryset, context):
+    return JSONRenderer().render(
+        ReadRecipeSerializer(
+            queryset.with_related(), many=True, context=context
+        ).data
+    )
+
+
+def serialize_rows(queryset, context):
+    return ORJSONRenderer().render(
+        RecipeListSerializer(
+            list(queryset.values(*RecipeListSerializer.get_values())),
+            context=context
+        ).data
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'compares CPU time of a recipe list page with the DRF serializer '
+        'and with the row serializer, and checks that the JSON is equal'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        user = User.objects.annotate(
+            favorites_total=Count('favorites')
+        ).order_by('-favorites_total').first()
+        if user is None or not Recipe.objects.exists():
+            raise CommandError(
+                'Database is empty, run generate_benchmark_data first.'
+            )
+        request = RequestFactory().get('/api/recipes/')
+        request.user = user
+        context = {'request': request}
+        page_size = options['page_size']
+        recipes = Recipe.objects.with_user_flags(
+            user
+        ).with_renditions_ready()
+        pages = [
+            recipes.filter(favorites__user=user)[:page_size],
+            recipes[:page_size],
+            recipes[page_size:page_size * 2],
+        ]
+        # Urls are built for the RequestFactory host.
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            self.compare(pages, context, options['repeat'], page_size)
+
+    def compare(self, pages, context, repeat, page_size):
+        for queryset in pages:
+            if serialize_models(queryset, context) != serialize_rows(
+                queryset, context
+            ):
+                raise CommandError('Serializers produce different JSON.')
+        results = {}
+        for name, serialize in (
+            ('ReadRecipeSerializer + JSONRenderer', serialize_models),
+            ('RecipeListSerializer + ORJSONRenderer', serialize_rows),
+        ):
+            timings = []
+            for _ in range(repeat):
+                started = time.process_time()
+                serialize(pages[1], context)
+                timings.append((time.process_time() - started) * 1000)
+            results[name] = statistics.median(timings)
+            self.stdout.write(
+                f'{name:40} {results[name]:8.2f} ms CPU per '
+                f'{page_size} recipes'
+            )
+        before, after = results.values()
+        self.stdout.write(self.style.SUCCESS(
+            f'Identical JSON, {before / after:.1f}x less CPU per page.'
+        ))
@@ -0,0 +1,145 @@
+import re
+from itertools import combinations
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.views import RecipeViewSet
+from dish.models import Recipe, Tag
+
+
+User = get_user_model()
+
+EXPLAIN_PREFIXES = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN ',
+}
+VIEWS = {
+    'list': RecipeViewSet.as_view({'get': 'list'}),
+    'feed': RecipeViewSet.as_view({'get': 'feed'}),
+}
+SQLITE_SCAN_RE = re.compile(r'\bSCAN (?:TABLE )?(\w+)(.*)')
+POSTGRES_SCAN_RE = re.compile(r'Seq Scan on (\w+)')
+
+
+def get_full_scans(plan, vendor):
+    """Returns tables that the query plan reads without an index."""
+    tables = []
+    for line in plan.splitlines():
+        if vendor == 'postgresql':
+            match = POSTGRES_SCAN_RE.search(line)
+            if match:
+                tables.append(match.group(1))
+            continue
+        match = SQLITE_SCAN_RE.search(line)
+        if match and not any(
+            usage in match.group(2)
+            for usage in ('USING INDEX', 'USING COVERING INDEX',
+                          'VIRTUAL TABLE INDEX')
+        ):
+            tables.append(match.group(1))
+    return tables
+
+
+def get_filter_values(user):
+    recipe = Recipe.objects.only('author_id').first()
+    tag = Tag.objects.only('slug').first()
+    values = {
+        'author': str(recipe.author_id if recipe else user.id),
+        'is_favorited': '1',
+        'is_in_shopping_cart': '1',
+        'search': 'суп',
+    }
+    if tag is not None:
+        values['tags'] = tag.slug
+    return values
+
+
+class Command(BaseCommand):
+    help = (
+        'explains every query of the recipe list and feed for every '
+        'filter combination and fails on full table scans'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--no-analyze', action='store_true',
+            help='keep the current planner statistics'
+        )
+
+    def handle(self, *args, **options):
+        user = User.objects.order_by('id').first()
+        if user is None:
+            raise CommandError(
+                'No users found, run generate_benchmark_data first.'
+            )
+        vendor = connection.vendor
+        if vendor not in ('sqlite', 'postgresql'):
+            raise CommandError(f'Query plans of {vendor} are not supported.')
+        if not options['no_analyze']:
+            # Without statistics the planner guesses table sizes and the
+            # plans differ from production ones.
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        values = get_filter_values(user)
+        failures = []
+        checked = 0
+        for size in range(len(values) + 1):
+            for names in combinations(sorted(values), size):
+                params = {name: values[name] for name in names}
+                for view_name in VIEWS:
+                    label = f'{view_name}: {"&".join(names) or "no filters"}'
+                    for sql, plan in self.explain(user, view_name, params):
+                        checked += 1
+                        scans = get_full_scans(plan, vendor)
+                        if scans:
+                            failures.append(label)
+                            self.stdout.write(self.style.ERROR(
+                                f'{label}: full scan of {", ".join(scans)}'
+                            ))
+                            self.stdout.write(sql)
+                            self.stdout.write(plan)
+                        elif options['verbosity'] > 1:
+                            self.stdout.write(f'{label}: ok')
+                            self.stdout.write(sql)
+                            self.stdout.write(plan)
+        if failures:
+            raise CommandError(
+                f'{len(failures)} recipe queries use full scans.'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {checked} recipe queries, no full scans.'
+        ))
+
+    def explain(self, user, view_name, params):
+        """Runs the view and returns the plans of all its queries: the
+        count, the page and the tags and ingredients of the page.
+        """
+        request = APIRequestFactory().get(f'/api/recipes/{view_name}/', params)
+        force_authenticate(request, user=user)
+        with CaptureQueriesContext(connection) as queries:
+            response = VIEWS[view_name](request)
+        if response.status_code != 200:
+            raise CommandError(
+                f'{view_name} {params} returned {response.status_code}: '
+                f'{response.data}'
+            )
+        plans = []
+        # On small tables Postgres prefers sequential scans, so they are
+        # disabled to check that a usable index exists at all.
+        with transaction.atomic(), connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            for query in queries.captured_queries:
+                sql = query['sql']
+                if not sql.lstrip().upper().startswith('SELECT'):
+                    continue
+                cursor.execute(EXPLAIN_PREFIXES[connection.vendor] + sql)
+                plans.append((sql, '\n'.join(
+                    ' '.join(str(column) for column in row)
+                    for row in cursor.fetchall()
+                )))
+        return plans
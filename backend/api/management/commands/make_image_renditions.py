@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from api.images import has_renditions, is_stored_image, make_renditions
+from dish.models import Recipe, StoredImage
+
+
+class Command(BaseCommand):
+    help = (
+        'makes missing renditions of recipe images, left by failed, lost '
+        'or skipped background jobs'
+    )
+
+    def handle(self, *args, **options):
+        names = list(StoredImage.objects.filter(
+            renditions_ready=False, references__gt=0
+        ).values_list('name', flat=True))
+        # Images saved before the content-addressed storage have no
+        # readiness flag, their files are checked.
+        names += [
+            name for name in Recipe.objects.exclude(image='').order_by(
+            ).values_list('image', flat=True).distinct()
+            if not is_stored_image(name) and not has_renditions(name)
+        ]
+        failed = 0
+        for name in names:
+            try:
+                make_renditions(name)
+            except Exception as error:
+                failed += 1
+                self.stderr.write(f'{name}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Made renditions of {len(names) - failed} images, '
+            f'{failed} failed.'
+        ))
@@ -0,0 +1,109 @@
+from bisect import bisect_left
+from threading import Lock
+
+from django.http import HttpResponse
+from rest_framework.permissions import IsAdminUser
+from rest_framework.views import APIView
+
+from .replicas import replica_monitor
+
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+LABELS = ('route', 'method', 'status')
+
+
+def escape_label(value):
+    """Label value escaped for the Prometheus text format."""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace(
+        '\n', '\\n'
+    )
+
+
+class Histogram:
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RequestMetrics:
+    """Per-route request statistics of the current worker process."""
+
+    names = (
+        ('request_duration_seconds', 'Total request time.'),
+        ('db_duration_seconds', 'Time spent in SQL queries.'),
+        ('db_queries', 'Number of SQL queries per request.'),
+    )
+    buckets = {'db_queries': COUNT_BUCKETS}
+
+    def __init__(self):
+        self._lock = Lock()
+        self._histograms = {}
+
+    def get_histogram(self, name, labels):
+        key = (name, labels)
+        if key not in self._histograms:
+            self._histograms[key] = Histogram(
+                self.buckets.get(name, BUCKETS)
+            )
+        return self._histograms[key]
+
+    def observe(self, route, method, status, total, db_time, queries):
+        labels = (route, method, str(status))
+        with self._lock:
+            self.get_histogram(
+                'request_duration_seconds', labels
+            ).observe(total)
+            self.get_histogram('db_duration_seconds', labels).observe(
+                db_time
+            )
+            self.get_histogram('db_queries', labels).observe(queries)
+
+    def export(self):
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+        for name, description in self.names:
+            metric = f'foodgram_{name}'
+            lines.append(f'# HELP {metric} {description}')
+            lines.append(f'# TYPE {metric} histogram')
+            for (histogram_name, labels), histogram in histograms:
+                if histogram_name != name:
+                    continue
+                label = ','.join(
+                    f'{key}="{escape_label(value)}"'
+                    for key, value in zip(LABELS, labels)
+                )
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(
+                        f'{metric}_bucket{{{label},le="{bound}"}} {cumulative}'
+                    )
+                lines.append(
+                    f'{metric}_bucket{{{label},le="+Inf"}} {histogram.count}'
+                )
+                lines.append(f'{metric}_sum{{{label}}} {histogram.sum}')
+                lines.append(f'{metric}_count{{{label}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+request_metrics = RequestMetrics()
+
+
+class MetricsView(APIView):
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return HttpResponse(
+            request_metrics.export() + replica_monitor.export(),
+            content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
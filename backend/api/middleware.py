@@ -0,0 +1,128 @@
+import asyncio
+import logging
+from contextlib import ExitStack
+from time import perf_counter
+
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+from .metrics import request_metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueryTimer:
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0
+        self.slowest_time = 0
+        self.slowest_sql = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = perf_counter() - started
+            self.count += 1
+            self.time += duration
+            if duration > self.slowest_time:
+                self.slowest_time = duration
+                self.slowest_sql = sql
+
+
+class PerformanceMiddleware:
+    """Measures SQL, view, render and total time of every request.
+
+    The timings are sent in the Server-Timing header, slow requests are
+    logged with their slowest query, and per-route histograms are
+    collected for the metrics endpoint. DRF serialization runs inside the
+    view, so it is reported as ``app``: view time without SQL time.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        timer = self.start(request)
+        started = perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        self.finish(request, response, timer, started)
+        return response
+
+    async def __acall__(self, request):
+        # Queries of async views run in worker threads, which install
+        # the timer on their own connections.
+        request.query_timer = timer = self.start(request)
+        started = perf_counter()
+        response = await self.get_response(request)
+        self.finish(request, response, timer, started)
+        return response
+
+    def start(self, request):
+        request.performance = {}
+        return QueryTimer()
+
+    def finish(self, request, response, timer, started):
+        timings = request.performance
+        finished = perf_counter()
+        total = finished - started
+        if 'view' not in timings:
+            timings['view'] = finished - timings.get('view_started', finished)
+        app = max(timings['view'] - timer.time, 0)
+        response['Server-Timing'] = ', '.join((
+            f'db;desc="{timer.count} queries";dur={timer.time * 1000:.1f}',
+            f'app;dur={app * 1000:.1f}',
+            f'render;dur={timings.get("render", 0) * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ))
+        # Url names keep the label readable and the same for the router
+        # and the async views of a route.
+        match = request.resolver_match
+        route = match.view_name if match else 'unmatched'
+        request_metrics.observe(
+            route, request.method, response.status_code,
+            total, timer.time, timer.count
+        )
+        if (
+            total * 1000 > settings.PERFORMANCE_SLOW_REQUEST_MS
+            or timer.count > settings.PERFORMANCE_SLOW_ROUTE_QUERIES.get(
+                route, settings.PERFORMANCE_SLOW_REQUEST_QUERIES
+            )
+        ):
+            logger.warning(
+                'Slow request %s %s: %.1f ms, %d queries (%.1f ms), '
+                'slowest query %.1f ms: %s',
+                request.method, request.get_full_path(), total * 1000,
+                timer.count, timer.time * 1000, timer.slowest_time * 1000,
+                timer.slowest_sql
+            )
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.performance['view_started'] = perf_counter()
+
+    def process_template_response(self, request, response):
+        started = perf_counter()
+        request.performance['view'] = (
+            started - request.performance.get('view_started', started)
+        )
+
+        def finish_render(response):
+            request.performance['render'] = perf_counter() - started
+
+        response.add_post_render_callback(finish_render)
+        return response
@@ -1,7 +1,116 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
 
 
 class LimitNumberPagination(PageNumberPagination):
     page_size = api_settings.PAGE_SIZE
     page_size_query_param = 'limit'
+
+
+class LimitCursorPagination(LimitNumberPagination):
+    """Page number pagination with an opt-in keyset mode.
+
+    Passing ``cursor`` (empty for the first page) switches to keyset
+    pagination on ``(view.cursor_field, id)`` in descending order: no
+    OFFSET and no COUNT, with opaque next/previous cursors.
+    """
+
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+    cursor_only = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = (
+            self.cursor_only
+            or self.cursor_query_param in request.query_params
+        )
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.field = getattr(view, 'cursor_field', 'created')
+        page_size = self.get_page_size(request)
+        value, pk, reverse = self.decode_cursor(request)
+        if reverse:
+            queryset = queryset.filter(
+                Q(**{f'{self.field}__gt': value})
+                | Q(**{self.field: value, 'id__gt': pk})
+            ).order_by(self.field, 'id')
+        else:
+            if value is not None:
+                queryset = queryset.filter(
+                    Q(**{f'{self.field}__lt': value})
+                    | Q(**{self.field: value, 'id__lt': pk})
+                )
+            queryset = queryset.order_by(f'-{self.field}', '-id')
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+        has_next = has_more if not reverse else True
+        has_previous = value is not None if not reverse else has_more
+        self.next_cursor = (
+            self.encode_cursor(results[-1], False)
+            if has_next and results else None
+        )
+        self.previous_cursor = (
+            self.encode_cursor(results[0], True)
+            if has_previous and results else None
+        )
+        return results
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, None, False
+        try:
+            value, pk, reverse = json.loads(
+                base64.urlsafe_b64decode(encoded.encode('ascii'))
+            )
+            value = parse_datetime(value)
+            if value is None:
+                raise ValueError
+            pk = int(pk)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        return value, pk, bool(reverse)
+
+    def encode_cursor(self, obj, reverse):
+        if isinstance(obj, dict):
+            value, pk = obj[self.field], obj['id']
+        else:
+            value, pk = getattr(obj, self.field), obj.id
+        cursor = json.dumps((value.isoformat(), pk, int(reverse)))
+        return base64.urlsafe_b64encode(cursor.encode('ascii')).decode()
+
+    def get_cursor_link(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, cursor
+        )
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict((
+            ('next', self.get_cursor_link(self.next_cursor)),
+            ('previous', self.get_cursor_link(self.previous_cursor)),
+            ('results', data)
+        )))
+
+
+class KeysetPagination(LimitCursorPagination):
+    """Keyset pagination without the page number mode."""
+
+    cursor_only = True
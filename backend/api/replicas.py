@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import os
+import random
+from contextvars import ContextVar
+from hashlib import sha256
+from threading import Lock
+from time import monotonic
+
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from rest_framework.permissions import SAFE_METHODS
+
+
+logger = logging.getLogger(__name__)
+
+PIN_KEY = 'replica_pin:{}'
+# Token lookups must see tokens created a moment ago by the login request.
+PRIMARY_APPS = {'authtoken'}
+POSTGRES_LAG = """
+    SELECT CASE WHEN pg_is_in_recovery()
+        THEN coalesce(
+            extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0
+        )
+        ELSE 0 END
+"""
+
+# Reads outside of requests (management commands, shell, signals of
+# writes) go to the primary; only ReplicaMiddleware lets them through.
+use_primary = ContextVar('use_primary', default=True)
+
+
+def measure_lag(alias):
+    """Seconds the replica is behind the primary."""
+    connection = connections[alias]
+    if connection.vendor == 'sqlite':
+        # Local stand-in: the replica file is a copy of the primary one.
+        primary = connections[DEFAULT_DB_ALIAS].settings_dict['NAME']
+        replica = connection.settings_dict['NAME']
+        return max(os.path.getmtime(primary) - os.path.getmtime(replica), 0)
+    with connection.cursor() as cursor:
+        cursor.execute(POSTGRES_LAG)
+        return float(cursor.fetchone()[0])
+
+
+class ReplicaMonitor:
+    """Replica lag of the current worker, measured at most once per
+    REPLICA_LAG_CHECK_INTERVAL for each replica.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._lags = {}
+
+    def get_lag(self, alias):
+        now = monotonic()
+        checked, lag = self._lags.get(alias, (None, None))
+        if checked is not None and (
+            now - checked < settings.REPLICA_LAG_CHECK_INTERVAL
+        ):
+            return lag
+        try:
+            lag = measure_lag(alias)
+        except (DatabaseError, OSError):
+            logger.exception('Replica %s is unavailable', alias)
+            lag = None
+        with self._lock:
+            self._lags[alias] = (now, lag)
+        return lag
+
+    def get_available(self):
+        lags = {
+            alias: self.get_lag(alias) for alias in settings.DATABASE_REPLICAS
+        }
+        return [
+            alias for alias, lag in lags.items()
+            if lag is not None and lag <= settings.REPLICA_MAX_LAG
+        ]
+
+    def export(self):
+        metric = 'foodgram_replica_lag_seconds'
+        lines = [
+            f'# HELP {metric} Replica lag, -1 if unavailable.',
+            f'# TYPE {metric} gauge',
+        ]
+        for alias in settings.DATABASE_REPLICAS:
+            lag = self.get_lag(alias)
+            lines.append(
+                f'{metric}{{alias="{alias}"}} {-1 if lag is None else lag}'
+            )
+        return '\n'.join(lines) + '\n'
+
+
+replica_monitor = ReplicaMonitor()
+
+
+class ReplicaRouter:
+    """Sends reads of safe requests to replicas and the rest to the
+    primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        if (
+            use_primary.get()
+            or model._meta.app_label in PRIMARY_APPS
+            or not settings.DATABASE_REPLICAS
+        ):
+            return DEFAULT_DB_ALIAS
+        replicas = replica_monitor.get_available()
+        if not replicas:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def get_pin_key(request):
+    credentials = (
+        request.META.get('HTTP_AUTHORIZATION')
+        or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    )
+    if not credentials:
+        return None
+    return PIN_KEY.format(sha256(credentials.encode()).hexdigest())
+
+
+class ReplicaMiddleware:
+    """Lets safe requests read from replicas.
+
+    A client that has just written is pinned to the primary for
+    REPLICA_PIN_SECONDS, so it reads its own favorites and cart changes
+    before they reach the replicas.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        key, token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            use_primary.reset(token)
+        self.finish(request, key)
+        return response
+
+    async def __acall__(self, request):
+        key, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            use_primary.reset(token)
+        self.finish(request, key)
+        return response
+
+    def start(self, request):
+        """Returns the pin key, None when no replicas are configured and
+        everything reads from the primary anyway.
+        """
+        if not settings.DATABASE_REPLICAS:
+            return None, use_primary.set(True)
+        key = get_pin_key(request)
+        primary = (
+            request.method not in SAFE_METHODS
+            or (key is not None and cache.get(key) is not None)
+        )
+        return key, use_primary.set(primary)
+
+    def finish(self, request, key):
+        if request.method not in SAFE_METHODS and key is not None:
+            cache.set(key, True, timeout=settings.REPLICA_PIN_SECONDS)
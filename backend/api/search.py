@@ -0,0 +1,62 @@
+from bisect import bisect_left
+from threading import Lock
+
+from dish.models import Ingredient
+from .cache import get_version
+
+
+class IngredientIndex:
+    """Process-local index of ingredient names for autocomplete.
+
+    Rows are kept sorted by lowercased name, so prefix queries are answered
+    with a binary search; substring matches are ranked after prefix ones.
+    The index is rebuilt when the shared ingredients version changes.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._version = None
+        self._keys = None
+        self._rows = None
+
+    def _load(self):
+        version = get_version('ingredients')
+        with self._lock:
+            if self._rows is None or self._version != version:
+                ingredients = sorted(
+                    (name.lower(), id, name, measurement_unit)
+                    for id, name, measurement_unit in (
+                        Ingredient.objects.values_list(
+                            'id', 'name', 'measurement_unit'
+                        ).order_by()
+                    )
+                )
+                self._keys = [ingredient[0] for ingredient in ingredients]
+                self._rows = [
+                    {'id': id, 'name': name, 'measurement_unit': unit}
+                    for _, id, name, unit in ingredients
+                ]
+                self._version = version
+            return self._keys, self._rows
+
+    def search(self, query='', limit=None):
+        keys, rows = self._load()
+        query = query.lower()
+        if not query:
+            return rows[:limit]
+        start = bisect_left(keys, query)
+        end = start
+        while end < len(keys) and keys[end].startswith(query):
+            end += 1
+        result = rows[start:end]
+        if limit is not None and len(result) >= limit:
+            return result[:limit]
+        for position, key in enumerate(keys):
+            if query in key and not start <= position < end:
+                result.append(rows[position])
+                if limit is not None and len(result) >= limit:
+                    break
+        return result
+
+
+ingredient_index = IngredientIndex()
@@ -1,20 +1,92 @@
+from collections import OrderedDict, defaultdict
+
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
+from dish import cart_totals
+from dish.search import update_search_index
+from dish.similarity import similar_recipes
 from dish.models import (
     Tag,
     Ingredient,
     Recipe,
     RecipeIngredient,
+    RecipeTag,
     Favorite,
-    ShoppingCart
+    ShoppingCart,
+    ShoppingCartIngredient
 )
-from .fields import Base64ImageField
+from .fields import Base64ImageField, ImageRenditionsField
+from .images import get_rendition_urls
 
 
 User = get_user_model()
 
+RECIPE_FIELDS = (
+    'id', 'tags', 'author', 'thumbnails', 'ingredients', 'is_favorited',
+    'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time'
+)
+# Recipe columns read by each output field; tags and ingredients come
+# from prefetches and the flags from annotations.
+RECIPE_FIELD_COLUMNS = {
+    'author': (
+        'author__id', 'author__email', 'author__username',
+        'author__first_name', 'author__last_name'
+    ),
+    'thumbnails': ('image',),
+    'name': ('name',),
+    'image': ('image',),
+    'text': ('text',),
+    'cooking_time': ('cooking_time',),
+}
+USER_FLAGS = ('is_favorited', 'is_in_shopping_cart')
+
+
+def get_recipe_fields(query_params):
+    """Recipe output fields left by the ``fields`` and ``omit`` query
+    parameters, comma separated field names.
+    """
+    fields = RECIPE_FIELDS
+    for param in ('fields', 'omit'):
+        names = {
+            name.strip()
+            for value in query_params.getlist(param)
+            for name in value.split(',') if name.strip()
+        }
+        if not names:
+            continue
+        unknown = names.difference(RECIPE_FIELDS)
+        if unknown:
+            raise ValidationError({
+                param: f'Неизвестные поля: {", ".join(sorted(unknown))}.'
+            })
+        fields = tuple(
+            name for name in fields if (name in names) == (param == 'fields')
+        )
+    return fields
+
+
+def get_recipe_columns(fields):
+    """Recipe columns, for ``only()`` or ``values()``, needed by the
+    output fields.
+    """
+    columns = {'id': None}
+    for name in fields:
+        columns.update(dict.fromkeys(RECIPE_FIELD_COLUMNS.get(name, ())))
+    return tuple(columns)
+
+
+def get_image_url(name, request=None):
+    """Same url as ``serializers.ImageField`` gives for the file name."""
+    if not name:
+        return None
+    url = Recipe._meta.get_field('image').storage.url(name)
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
 
 class AuthorSerializer(serializers.ModelSerializer):
     class Meta:
@@ -54,11 +126,21 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class BaseIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all(),
-        source='ingredient'
+class ShoppingCartIngredientSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='ingredient_id')
+    name = serializers.CharField(source='ingredient.name')
+    measurement_unit = serializers.CharField(
+        source='ingredient.measurement_unit'
     )
+    amount = serializers.IntegerField(source='total_amount')
+
+    class Meta:
+        model = ShoppingCartIngredient
+        fields = ('id', 'name', 'measurement_unit', 'amount')
+
+
+class BaseIngredientSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='ingredient_id')
 
     class Meta:
         model = RecipeIngredient
@@ -66,14 +148,25 @@ class BaseIngredientSerializer(serializers.ModelSerializer):
 
 
 class BaseRecipeSerializer(serializers.ModelSerializer):
+    thumbnails = ImageRenditionsField(source='image')
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'thumbnails', 'cooking_time')
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=1000
+    )
 
 
 class ReadRecipeSerializer(serializers.ModelSerializer):
     tags = TagSerializer(read_only=True, many=True)
     author = AuthorSerializer(read_only=True)
+    thumbnails = ImageRenditionsField(source='image')
     ingredients = RecipeIngredientSerializer(
         read_only=True,
         many=True,
@@ -84,9 +177,26 @@ class ReadRecipeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
-        exclude = ('created',)
+        exclude = (
+            'created',
+            'favorites_count',
+            'in_carts_count',
+            'search_vector'
+        )
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selected = self.context.get('fields')
+        if selected is None:
+            return fields
+        return OrderedDict(
+            (name, field) for name, field in fields.items()
+            if name in selected
+        )
 
     def get_is_favorited(self, recipe):
+        if hasattr(recipe, 'is_favorited'):
+            return recipe.is_favorited
         user = self.context.get('request').user
         if user.is_authenticated:
             return Favorite.objects.filter(
@@ -95,6 +205,8 @@ class ReadRecipeSerializer(serializers.ModelSerializer):
         return False
 
     def get_is_in_shopping_cart(self, recipe):
+        if hasattr(recipe, 'is_in_shopping_cart'):
+            return recipe.is_in_shopping_cart
         user = self.context.get('request').user
         if user.is_authenticated:
             return ShoppingCart.objects.filter(
@@ -126,37 +238,112 @@ class WriteRecipeSerializer(serializers.ModelSerializer):
         )
 
     def to_representation(self, instance):
+        request = self.context.get('request')
+        instance = Recipe.objects.with_related().with_user_flags(
+            request.user
+        ).with_renditions_ready().get(pk=instance.pk)
         serializer = ReadRecipeSerializer(
             instance=instance,
-            context={'request': self.context.get('request')}
+            context={'request': request}
         )
         return serializer.data
 
+    def set_ingredients(self, recipe, ingredients, created=False):
+        new_amounts = {
+            ingredient['ingredient_id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        current = {} if created else {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in recipe.recipeingredients.all()
+        }
+        removed = current.keys() - new_amounts.keys()
+        deltas = {
+            ingredient_id: -current[ingredient_id].amount
+            for ingredient_id in removed
+        }
+        if removed:
+            RecipeIngredient.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        to_create = []
+        to_update = []
+        for ingredient_id, amount in new_amounts.items():
+            recipe_ingredient = current.get(ingredient_id)
+            if recipe_ingredient is None:
+                to_create.append(RecipeIngredient(
+                    recipe=recipe, ingredient_id=ingredient_id, amount=amount
+                ))
+                deltas[ingredient_id] = amount
+            elif recipe_ingredient.amount != amount:
+                deltas[ingredient_id] = amount - recipe_ingredient.amount
+                recipe_ingredient.amount = amount
+                to_update.append(recipe_ingredient)
+        RecipeIngredient.objects.bulk_create(to_create)
+        RecipeIngredient.objects.bulk_update(to_update, ('amount',))
+        if not created:
+            cart_totals.change_recipe(recipe.id, deltas)
+
+    def set_tags(self, recipe, tags, created=False):
+        new_ids = {tag.id for tag in tags}
+        current_ids = set() if created else set(
+            recipe.recipetags.order_by().values_list('tag_id', flat=True)
+        )
+        removed = current_ids - new_ids
+        if removed:
+            RecipeTag.objects.filter(
+                recipe=recipe, tag_id__in=removed
+            ).delete()
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=recipe, tag_id=tag_id)
+            for tag_id in new_ids - current_ids
+        )
+
+    def update_similar_recipes(self, recipe):
+        recipe_id = recipe.id
+        transaction.on_commit(
+            lambda: similar_recipes.schedule_update(recipe_id)
+        )
+
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('recipeingredients')
+        tags = validated_data.pop('tags')
         recipe = super().create(validated_data)
-        for ingredient in ingredients:
-            RecipeIngredient.objects.create(**ingredient, recipe=recipe)
+        self.set_ingredients(recipe, ingredients, created=True)
+        self.set_tags(recipe, tags, created=True)
+        update_search_index((recipe.id,))
+        self.update_similar_recipes(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, recipe, validated_data):
-        new_ingredients = validated_data.pop('recipeingredients')
-        recipe.ingredients.clear()
-        for ingredient in new_ingredients:
-            RecipeIngredient.objects.create(**ingredient, recipe=recipe)
-        recipe.tags.clear()
-        return super().update(recipe, validated_data)
+        ingredients = validated_data.pop('recipeingredients')
+        tags = validated_data.pop('tags')
+        self.set_ingredients(recipe, ingredients)
+        self.set_tags(recipe, tags)
+        recipe = super().update(recipe, validated_data)
+        update_search_index((recipe.id,))
+        self.update_similar_recipes(recipe)
+        return recipe
 
     def validate_ingredients(self, ingredients):
         if not ingredients:
             raise ValidationError(detail='Необходимо указать ингредиенты.')
-        ingredients_list = (
-            ingredient['ingredient'] for ingredient in ingredients
-        )
-        if len(ingredients) > len(set(ingredients_list)):
+        ingredients_ids = {
+            ingredient['ingredient_id'] for ingredient in ingredients
+        }
+        if len(ingredients) > len(ingredients_ids):
             raise ValidationError(
                 detail='В рецепте не должно быть повторяющихся ингредиетов.'
             )
+        existing_ids = set(Ingredient.objects.filter(
+            id__in=ingredients_ids
+        ).values_list('id', flat=True))
+        if ingredients_ids - existing_ids:
+            raise ValidationError(
+                detail='Указаны несуществующие ингредиенты.'
+            )
         return ingredients
 
     def validate_tags(self, tags):
@@ -174,3 +361,94 @@ class WriteRecipeSerializer(serializers.ModelSerializer):
         if not data.get('tags'):
             raise ValidationError('Укажите поле tags.')
         return data
+
+
+class RecipeListSerializer:
+    """Output of ``ReadRecipeSerializer(many=True)`` built from rows.
+
+    Takes ``Recipe.objects.values(*RecipeListSerializer.get_values())``
+    rows and fetches tags and ingredients of the page with one query
+    each, skipping the per-field machinery of the nested serializers.
+    ``context['fields']`` limits the output like it does for
+    ``ReadRecipeSerializer``.
+    """
+
+    def __init__(self, recipes, context=None):
+        self.recipes = recipes
+        self.context = context or {}
+
+    @staticmethod
+    def get_values(fields=RECIPE_FIELDS):
+        return get_recipe_columns(fields) + ('created',) + tuple(
+            flag for flag in USER_FLAGS if flag in fields
+        ) + (('renditions_ready',) if 'thumbnails' in fields else ())
+
+    def get_tags(self, ids):
+        tags = defaultdict(list)
+        for recipe_id, id, name, color, slug in RecipeTag.objects.filter(
+            recipe_id__in=ids
+        ).order_by('tag__name').values_list(
+            'recipe_id', 'tag_id', 'tag__name', 'tag__color', 'tag__slug'
+        ):
+            tags[recipe_id].append(
+                {'id': id, 'name': name, 'color': color, 'slug': slug}
+            )
+        return tags
+
+    def get_ingredients(self, ids):
+        ingredients = defaultdict(list)
+        for recipe_id, id, name, unit, amount in (
+            RecipeIngredient.objects.filter(recipe_id__in=ids).order_by(
+                'ingredient__name', 'id'
+            ).values_list(
+                'recipe_id', 'ingredient_id', 'ingredient__name',
+                'ingredient__measurement_unit', 'amount'
+            )
+        ):
+            ingredients[recipe_id].append({
+                'id': id,
+                'name': name,
+                'measurement_unit': unit,
+                'amount': amount
+            })
+        return ingredients
+
+    @property
+    def data(self):
+        request = self.context.get('request')
+        fields = self.context.get('fields')
+        if fields is None:
+            fields = RECIPE_FIELDS
+        ids = [recipe['id'] for recipe in self.recipes]
+        if 'tags' in fields:
+            tags = self.get_tags(ids)
+        if 'ingredients' in fields:
+            ingredients = self.get_ingredients(ids)
+        getters = {
+            'id': lambda recipe: recipe['id'],
+            'tags': lambda recipe: tags[recipe['id']],
+            'author': lambda recipe: {
+                'email': recipe['author__email'],
+                'id': recipe['author__id'],
+                'username': recipe['author__username'],
+                'first_name': recipe['author__first_name'],
+                'last_name': recipe['author__last_name'],
+            },
+            'thumbnails': lambda recipe: get_rendition_urls(
+                recipe['image'], request, recipe['renditions_ready']
+            ),
+            'ingredients': lambda recipe: ingredients[recipe['id']],
+            'is_favorited': lambda recipe: recipe['is_favorited'],
+            'is_in_shopping_cart': (
+                lambda recipe: recipe['is_in_shopping_cart']
+            ),
+            'name': lambda recipe: recipe['name'],
+            'image': lambda recipe: get_image_url(recipe['image'], request),
+            'text': lambda recipe: recipe['text'],
+            'cooking_time': lambda recipe: recipe['cooking_time'],
+        }
+        getters = [(name, getters[name]) for name in fields]
+        return [
+            {name: get(recipe) for name, get in getters}
+            for recipe in self.recipes
+        ]
@@ -0,0 +1,52 @@
+import csv
+import json
+
+from dish.models import ShoppingCartIngredient
+
+
+CHUNK_SIZE = 2000
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def get_shopping_cart_ingredients(user):
+    return (
+        ShoppingCartIngredient.objects.filter(user=user).values_list(
+            'ingredient__name', 'ingredient__measurement_unit', 'total_amount'
+        ).order_by('ingredient__name').iterator(chunk_size=CHUNK_SIZE)
+    )
+
+
+def stream_txt(ingredients):
+    for ingredient, measurement_unit, amount in ingredients:
+        yield f'{ingredient} ({measurement_unit}) - {amount}\n'
+
+
+def stream_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for row in ingredients:
+        yield writer.writerow(row)
+
+
+def stream_json(ingredients):
+    separator = ''
+    yield '['
+    for ingredient, measurement_unit, amount in ingredients:
+        yield separator + json.dumps({
+            'name': ingredient,
+            'measurement_unit': measurement_unit,
+            'amount': amount
+        }, ensure_ascii=False)
+        separator = ','
+    yield ']'
+
+
+SHOPPING_CART_STREAMS = {
+    'txt': stream_txt,
+    'csv': stream_csv,
+    'json': stream_json,
+}
@@ -0,0 +1,66 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from dish.models import Ingredient, Recipe, Tag
+from dish.storage import image_storage
+from .authentication import forget_tokens
+from .cache import bump_version
+from .images import delete_image, schedule_renditions
+
+
+User = get_user_model()
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def bump_ingredients_version(**kwargs):
+    bump_version('ingredients')
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def bump_tags_version(**kwargs):
+    bump_version('tags')
+
+
+@receiver((post_save, post_delete), sender=Token)
+def forget_token(sender, instance, **kwargs):
+    forget_tokens((instance.key,))
+
+
+@receiver(post_save, sender=User)
+def forget_user_tokens(sender, instance, created, **kwargs):
+    if not created:
+        forget_tokens(
+            Token.objects.filter(user=instance).values_list('key', flat=True)
+        )
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_replaced_image(sender, instance, **kwargs):
+    instance._replaced_image = None
+    instance._image_uploaded = not instance.image._committed
+    if instance.pk is None:
+        return
+    previous = Recipe.objects.filter(pk=instance.pk).values_list(
+        'image', flat=True
+    ).first()
+    # An upload takes a new reference even for the same bytes.
+    if not instance.image._committed or previous != instance.image.name:
+        instance._replaced_image = previous
+
+
+@receiver(post_save, sender=Recipe)
+def release_replaced_image(sender, instance, **kwargs):
+    image_storage.release(instance._replaced_image, delete_image)
+    if instance._image_uploaded:
+        # Every upload, from the API or the admin, gets renditions; their
+        # urls are served once the job marks the stored image ready.
+        name = instance.image.name
+        transaction.on_commit(lambda: schedule_renditions(name))
+
+
+@receiver(post_delete, sender=Recipe)
+def release_recipe_image(sender, instance, **kwargs):
+    image_storage.release(instance.image.name, delete_image)
@@ -0,0 +1,370 @@
+import base64
+import os
+import shutil
+import tempfile
+from collections import defaultdict
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models import Count, F
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from dish.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    RecipeTag,
+    ShoppingCart,
+    ShoppingCartIngredient,
+    StoredImage,
+    Tag
+)
+from users.models import Follow
+
+
+User = get_user_model()
+
+RECIPES_TOTAL = 60
+READERS_TOTAL = 20
+# Count, page, tags and ingredients of the page.
+RECIPE_LIST_QUERIES = 4
+
+
+class RecipeDataMixin:
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass'
+        )
+        cls.author = author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass'
+        )
+        cls.tags = tags = [
+            Tag.objects.create(name=slug, slug=slug, color=color)
+            for slug, color in (
+                ('breakfast', '#E26C2D'), ('lunch', '#49B64E')
+            )
+        ]
+        cls.ingredients = ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г'
+            )
+            for number in range(5)
+        ]
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=author,
+                name=f'Рецепт {number}',
+                text='Описание',
+                image='recipes/test.png',
+                cooking_time=10
+            )
+            for number in range(RECIPES_TOTAL)
+        )
+        cls.recipes = recipes = list(Recipe.objects.order_by('id'))
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=recipe, tag=tag)
+            for recipe in recipes for tag in tags
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=1)
+            for recipe in recipes for ingredient in ingredients
+        )
+        # Favorites and carts of many users, so that the planner
+        # statistics look like production ones.
+        User.objects.bulk_create(
+            User(
+                username=f'reader{number}',
+                email=f'reader{number}@example.com'
+            )
+            for number in range(READERS_TOTAL)
+        )
+        readers = list(User.objects.exclude(pk=author.pk))
+        Favorite.objects.bulk_create(
+            Favorite(user=reader, recipe=recipe)
+            for number, reader in enumerate(readers)
+            for recipe in recipes[number % 2::2][:10]
+        )
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=reader, recipe=recipe)
+            for number, reader in enumerate(readers)
+            for recipe in recipes[number % 3::3][:5]
+        )
+        Follow.objects.create(user=cls.user, followed_user=author)
+
+
+class RecipeListQueriesTest(RecipeDataMixin, TestCase):
+
+    def assert_list_queries(self, client):
+        for limit in (6, 50):
+            with self.subTest(limit=limit):
+                with self.assertNumQueries(RECIPE_LIST_QUERIES):
+                    response = client.get(f'/api/recipes/?limit={limit}')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.json()['results']), limit)
+
+    def test_anonymous_list_queries_do_not_grow_with_page(self):
+        self.assert_list_queries(APIClient())
+
+    def test_authenticated_list_queries_do_not_grow_with_page(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assert_list_queries(client)
+
+
+class QueryPlansTest(RecipeDataMixin, TestCase):
+
+    def test_recipe_queries_use_indexes(self):
+        call_command('check_query_plans', stdout=StringIO())
+
+
+def get_image(color):
+    buffer = BytesIO()
+    Image.new('RGB', (40, 30), color).save(buffer, format='PNG')
+    return (
+        'data:image/png;base64,'
+        + base64.b64encode(buffer.getvalue()).decode()
+    )
+
+
+class RecipeWriteMixin(RecipeDataMixin):
+    """Starts with consistent counters and cart totals and a buyer with
+    an empty cart.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.buyer = User.objects.create_user(
+            username='buyer', email='buyer@example.com', password='pass'
+        )
+        call_command('recount_counters', stdout=StringIO())
+
+    def setUp(self):
+        self.buyer_client = APIClient()
+        self.buyer_client.force_authenticate(self.buyer)
+        self.author_client = APIClient()
+        self.author_client.force_authenticate(self.author)
+
+    def get_recipe_data(self, ingredients, image=None):
+        data = {
+            'name': 'Новый рецепт',
+            'text': 'Описание',
+            'cooking_time': 5,
+            'tags': [self.tags[0].id],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': amount}
+                for ingredient, amount in ingredients
+            ],
+        }
+        if image is not None:
+            data['image'] = image
+        return data
+
+
+class CartTotalsTest(RecipeWriteMixin, TestCase):
+
+    def get_totals(self, user):
+        return dict(ShoppingCartIngredient.objects.filter(
+            user=user
+        ).values_list('ingredient_id', 'total_amount'))
+
+    def assert_totals(self, amounts):
+        self.assertEqual(self.get_totals(self.buyer), {
+            ingredient.id: amount
+            for ingredient, amount in zip(self.ingredients, amounts)
+            if amount
+        })
+        # Totals of all users match the carts.
+        expected = defaultdict(int)
+        for user_id, ingredient_id, amount in ShoppingCart.objects.values_list(
+            'user_id',
+            'recipe__recipeingredients__ingredient_id',
+            'recipe__recipeingredients__amount'
+        ):
+            expected[user_id, ingredient_id] += amount
+        self.assertEqual(
+            {
+                (user_id, ingredient_id): total_amount
+                for user_id, ingredient_id, total_amount in
+                ShoppingCartIngredient.objects.values_list(
+                    'user_id', 'ingredient_id', 'total_amount'
+                )
+            },
+            dict(expected)
+        )
+
+    def test_add_and_remove_recipes(self):
+        first, second = self.recipes[:2]
+        for recipe in (first, second):
+            response = self.buyer_client.post(
+                f'/api/recipes/{recipe.id}/shopping_cart/'
+            )
+            self.assertEqual(response.status_code, 201)
+        self.assert_totals([2] * 5)
+        self.buyer_client.delete(f'/api/recipes/{first.id}/shopping_cart/')
+        self.assert_totals([1] * 5)
+        self.buyer_client.delete(f'/api/recipes/{second.id}/shopping_cart/')
+        self.assert_totals([0] * 5)
+
+    def test_batch_add_and_remove_recipes(self):
+        ids = [recipe.id for recipe in self.recipes[:3]]
+        response = self.buyer_client.post(
+            '/api/recipes/shopping_cart/', {'ids': ids}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assert_totals([3] * 5)
+        response = self.buyer_client.delete(
+            '/api/recipes/shopping_cart/', {'ids': ids[:2]}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assert_totals([1] * 5)
+
+    def test_recipe_edit_changes_totals(self):
+        recipe = self.recipes[0]
+        self.buyer_client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+        response = self.author_client.patch(
+            f'/api/recipes/{recipe.id}/',
+            self.get_recipe_data(
+                ((self.ingredients[0], 4), (self.ingredients[1], 1))
+            ),
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assert_totals([4, 1, 0, 0, 0])
+
+    def test_recipe_delete_removes_it_from_totals(self):
+        first, second = self.recipes[:2]
+        for recipe in (first, second):
+            self.buyer_client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+        response = self.author_client.delete(f'/api/recipes/{first.id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assert_totals([1] * 5)
+
+
+class RecipeCountersTest(RecipeWriteMixin, TestCase):
+
+    def assert_counters(self, recipe, favorites_count, in_carts_count):
+        recipe.refresh_from_db()
+        self.assertEqual(
+            (recipe.favorites_count, recipe.in_carts_count),
+            (favorites_count, in_carts_count)
+        )
+        # Counters of all recipes match the relations.
+        self.assertFalse(
+            Recipe.objects.annotate(
+                favorites_total=Count('favorites', distinct=True),
+                carts_total=Count('shoppingcart', distinct=True)
+            ).exclude(
+                favorites_count=F('favorites_total'),
+                in_carts_count=F('carts_total')
+            ).exists()
+        )
+
+    def get_recipe(self):
+        recipe = self.recipes[0]
+        recipe.refresh_from_db()
+        return recipe
+
+    def test_favorites_change_favorites_count(self):
+        recipe = self.get_recipe()
+        favorites_count = recipe.favorites_count
+        in_carts_count = recipe.in_carts_count
+        self.buyer_client.post(f'/api/recipes/{recipe.id}/favorite/')
+        self.assert_counters(recipe, favorites_count + 1, in_carts_count)
+        self.buyer_client.delete(f'/api/recipes/{recipe.id}/favorite/')
+        self.assert_counters(recipe, favorites_count, in_carts_count)
+
+    def test_carts_change_in_carts_count(self):
+        recipe = self.get_recipe()
+        favorites_count = recipe.favorites_count
+        in_carts_count = recipe.in_carts_count
+        self.buyer_client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+        self.assert_counters(recipe, favorites_count, in_carts_count + 1)
+        self.buyer_client.delete(f'/api/recipes/{recipe.id}/shopping_cart/')
+        self.assert_counters(recipe, favorites_count, in_carts_count)
+
+    def test_batch_changes_counters(self):
+        recipe = self.get_recipe()
+        favorites_count = recipe.favorites_count
+        in_carts_count = recipe.in_carts_count
+        ids = [recipe.id for recipe in self.recipes[:3]]
+        for url in ('/api/recipes/favorite/', '/api/recipes/shopping_cart/'):
+            self.buyer_client.post(url, {'ids': ids}, format='json')
+        self.assert_counters(recipe, favorites_count + 1, in_carts_count + 1)
+        for url in ('/api/recipes/favorite/', '/api/recipes/shopping_cart/'):
+            self.buyer_client.delete(url, {'ids': ids}, format='json')
+        self.assert_counters(recipe, favorites_count, in_carts_count)
+
+
+@mock.patch('dish.similarity.schedule')
+@mock.patch('api.signals.schedule_renditions')
+class StoredImageReferencesTest(RecipeWriteMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.media_root = media_root
+
+    def write(self, method, url, data=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.author_client, method)(
+                url, data, format='json'
+            )
+        self.assertLess(response.status_code, 300, response.content)
+        return response
+
+    def create_recipe(self, image):
+        return self.write(
+            'post', '/api/recipes/', self.get_recipe_data(
+                ((self.ingredients[0], 1),), image
+            )
+        ).json()['id']
+
+    def get_image_name(self, recipe_id):
+        return Recipe.objects.get(pk=recipe_id).image.name
+
+    def get_references(self, name):
+        return StoredImage.objects.filter(name=name).values_list(
+            'references', flat=True
+        ).first()
+
+    def assert_stored(self, name, references):
+        self.assertEqual(self.get_references(name), references)
+        self.assertEqual(
+            os.path.exists(os.path.join(self.media_root, name)),
+            references is not None
+        )
+
+    def test_identical_uploads_share_one_file(self, *mocks):
+        first = self.create_recipe(get_image('red'))
+        second = self.create_recipe(get_image('red'))
+        name = self.get_image_name(first)
+        self.assertEqual(self.get_image_name(second), name)
+        self.assert_stored(name, 2)
+
+    def test_replaced_and_deleted_images_are_released(self, *mocks):
+        first = self.create_recipe(get_image('red'))
+        second = self.create_recipe(get_image('red'))
+        name = self.get_image_name(first)
+        self.write('patch', f'/api/recipes/{first}/', self.get_recipe_data(
+            ((self.ingredients[0], 1),), get_image('blue')
+        ))
+        replacement = self.get_image_name(first)
+        self.assertNotEqual(replacement, name)
+        self.assert_stored(name, 1)
+        self.assert_stored(replacement, 1)
+        self.write('delete', f'/api/recipes/{second}/')
+        self.assert_stored(name, None)
+        self.write('delete', f'/api/recipes/{first}/')
+        self.assert_stored(replacement, None)
@@ -1,7 +1,10 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
 from users.views import CustomUserViewSet
+from .async_views import get_async_urls
+from .metrics import MetricsView
 from .views import TagViewSet, IngredientViewSet, RecipeViewSet
 
 router = DefaultRouter()
@@ -11,7 +14,15 @@ router.register('ingredients', IngredientViewSet, basename='ingredient')
 router.register('recipes', RecipeViewSet, basename='recipe')
 router.register('users', CustomUserViewSet, basename='user')
 
-urlpatterns = [
+urlpatterns = []
+
+if settings.ASYNC_READ_VIEWS:
+    urlpatterns += get_async_urls(router, (
+        'recipe-list', 'recipe-detail', 'ingredient-list', 'tag-list'
+    ))
+
+urlpatterns += [
     path('', include(router.urls)),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
     path('auth/', include('djoser.urls.authtoken')),
 ]
@@ -1,67 +1,148 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import filters, viewsets, status
+from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
 from rest_framework.exceptions import ParseError
 from rest_framework.permissions import AllowAny, IsAuthenticated, SAFE_METHODS
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
+from dish import cart_totals
+from dish.counters import bulk_change, change_recipe_counter
 from dish.models import (
     Tag,
     Ingredient,
     Recipe,
     Favorite,
     ShoppingCart,
-    RecipeIngredient)
-from .filters import CustomRecipeFilter
+    ShoppingCartIngredient)
+from dish.similarity import similar_recipes
+from .cache import CachedListMixin
+from .filters import CustomRecipeFilter, IngredientSearchFilter, get_limit
 from .serializers import (
+    RECIPE_FIELDS,
+    USER_FLAGS,
+    get_recipe_columns,
+    get_recipe_fields,
     TagSerializer,
     IngredientSerializer,
     ReadRecipeSerializer,
     WriteRecipeSerializer,
-    BaseRecipeSerializer)
-from .pagination import LimitNumberPagination
+    BaseRecipeSerializer,
+    RecipeIdsSerializer,
+    RecipeListSerializer,
+    ShoppingCartIngredientSerializer)
+from .pagination import KeysetPagination, LimitCursorPagination
 from .permissions import IsAuthorOrReadOnly
+from .renderers import CSVRenderer, PlainTextRenderer
+from .search import ingredient_index
+from .shopping_cart import (
+    SHOPPING_CART_STREAMS,
+    get_shopping_cart_ingredients
+)
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(CachedListMixin, viewsets.ReadOnlyModelViewSet):
+    catalogue_name = 'tags'
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
     permission_classes = (AllowAny,)
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(CachedListMixin, viewsets.ReadOnlyModelViewSet):
+    catalogue_name = 'ingredients'
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
     permission_classes = (AllowAny,)
-    filter_backends = (filters.SearchFilter,)
-    search_fields = ('^name',)
+    filter_backends = (IngredientSearchFilter,)
+
+    def list(self, request, *args, **kwargs):
+        if not request.query_params or not settings.INGREDIENT_INDEX_ENABLED:
+            return super().list(request, *args, **kwargs)
+        return Response(ingredient_index.search(
+            request.query_params.get(api_settings.SEARCH_PARAM, ''),
+            get_limit(request)
+        ))
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     serializer_class = ReadRecipeSerializer
-    pagination_class = LimitNumberPagination
+    pagination_class = LimitCursorPagination
     permission_classes = (IsAuthorOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = CustomRecipeFilter
 
+    # Actions that take the fields and omit query parameters.
+    sparse_actions = ('list', 'retrieve', 'feed')
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.recipe_fields = RECIPE_FIELDS
+        if self.action in self.sparse_actions:
+            self.recipe_fields = get_recipe_fields(request.query_params)
+
+    def get_queryset(self):
+        fields = getattr(self, 'recipe_fields', RECIPE_FIELDS)
+        queryset = Recipe.objects.all()
+        if fields != RECIPE_FIELDS:
+            queryset = queryset.only(*get_recipe_columns(fields))
+        queryset = queryset.with_related(
+            author='author' in fields,
+            tags='tags' in fields,
+            ingredients='ingredients' in fields
+        )
+        return self.with_annotations(queryset)
+
+    def with_annotations(self, queryset):
+        fields = getattr(self, 'recipe_fields', RECIPE_FIELDS)
+        if any(flag in fields for flag in USER_FLAGS):
+            queryset = queryset.with_user_flags(self.request.user)
+        if 'thumbnails' in fields:
+            queryset = queryset.with_renditions_ready()
+        return queryset
+
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
             return ReadRecipeSerializer
         return WriteRecipeSerializer
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in self.sparse_actions:
+            context['fields'] = self.recipe_fields
+        return context
+
+    def list_response(self, queryset):
+        page = self.paginate_queryset(
+            self.filter_queryset(self.with_annotations(queryset)).values(
+                *RecipeListSerializer.get_values(self.recipe_fields)
+            )
+        )
+        return self.get_paginated_response(RecipeListSerializer(
+            page, context=self.get_serializer_context()
+        ).data)
+
+    def list(self, request, *args, **kwargs):
+        return self.list_response(Recipe.objects.all())
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    @transaction.atomic
     def favorite_shoppingcart_logic(self, request, pk, model):
         user = request.user
+        # Serializes with the batch changes of the same user.
+        cart_totals.lock_users((user.id,))
         if request.method == 'POST':
             try:
-                recipe = self.get_queryset().get(pk=pk)
+                recipe = Recipe.objects.get(pk=pk)
             except Recipe.DoesNotExist:
                 raise ParseError(detail='Такого рецепта не существует.')
             _, creation_status = model.objects.get_or_create(
@@ -80,6 +161,64 @@ class RecipeViewSet(viewsets.ModelViewSet):
             raise ParseError(detail='Этот рецепт еще не добавлен.')
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def bulk_favorite_shoppingcart_logic(self, request, model):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+        user = request.user
+        with transaction.atomic():
+            # Concurrent changes of the same user wait here, so the rows
+            # read below stay as they are until the commit.
+            cart_totals.lock_users((user.id,))
+            found = set(
+                Recipe.objects.filter(id__in=ids).values_list('id', flat=True)
+            )
+            user_recipes = model.objects.filter(user=user, recipe_id__in=ids)
+            added = set(user_recipes.values_list('recipe_id', flat=True))
+            if request.method == 'POST':
+                changed = found - added
+                model.objects.bulk_create(
+                    (model(user=user, recipe_id=pk) for pk in changed),
+                    ignore_conflicts=True
+                )
+                delta = 1
+                outcomes = ('added', 'already_added')
+            else:
+                token = bulk_change.set(True)
+                try:
+                    deleted, _ = user_recipes.delete()
+                finally:
+                    bulk_change.reset(token)
+                changed = added if deleted else set()
+                delta = -1
+                outcomes = ('removed', 'not_added')
+            if changed:
+                change_recipe_counter(model, changed, delta)
+                if model is ShoppingCart:
+                    if delta > 0:
+                        cart_totals.add_recipes(user.id, changed)
+                    else:
+                        cart_totals.remove_recipes(user.id, changed)
+        return Response({'results': [
+            {
+                'id': pk,
+                'status': (
+                    'not_found' if pk not in found
+                    else outcomes[0] if pk in changed else outcomes[1]
+                )
+            } for pk in ids
+        ]})
+
+    @action(detail=False, methods=('post', 'delete'), url_path='favorite',
+            permission_classes=(IsAuthenticated,))
+    def bulk_favorite(self, request):
+        return self.bulk_favorite_shoppingcart_logic(request, Favorite)
+
+    @action(detail=False, methods=('post', 'delete'),
+            url_path='shopping_cart', permission_classes=(IsAuthenticated,))
+    def bulk_shopping_cart(self, request):
+        return self.bulk_favorite_shoppingcart_logic(request, ShoppingCart)
+
     @action(detail=True, methods=('post', 'delete'),
             permission_classes=(IsAuthenticated,))
     def favorite(self, request, pk=None):
@@ -90,24 +229,52 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def shopping_cart(self, request, pk=None):
         return self.favorite_shoppingcart_logic(request, pk, ShoppingCart)
 
+    @action(detail=True)
+    def similar(self, request, pk=None):
+        recipe = get_object_or_404(Recipe.objects.only('id'), pk=pk)
+        # Rows are computed on writes and by build_similar_recipes; a read
+        # never takes the write lock of the file.
+        neighbours = similar_recipes.get(recipe.id) or []
+        ids = [recipe_id for recipe_id, _ in neighbours]
+        recipes = Recipe.objects.only(
+            'id', 'name', 'image', 'cooking_time'
+        ).with_renditions_ready().in_bulk(ids)
+        return Response(BaseRecipeSerializer(
+            [
+                recipes[recipe_id] for recipe_id in ids
+                if recipe_id in recipes
+            ][:get_limit(request)],
+            many=True,
+            context=self.get_serializer_context()
+        ).data)
+
+    @action(detail=False, permission_classes=(IsAuthenticated,),
+            pagination_class=KeysetPagination)
+    def feed(self, request):
+        return self.list_response(
+            Recipe.objects.followed_by(request.user)
+        )
+
     @action(detail=False, permission_classes=(IsAuthenticated,))
-    def download_shopping_cart(self, request):
-        ingredients = (
-            RecipeIngredient.objects.filter(
-                recipe__shoppingcart__user=request.user
-            ).values_list(
-                'ingredient__name', 'ingredient__measurement_unit'
-            ).annotate(amount=Sum('amount'))
+    def shopping_cart_summary(self, request):
+        ingredients = ShoppingCartIngredient.objects.filter(
+            user=request.user
+        ).select_related('ingredient').order_by('ingredient__name')
+        return Response(
+            ShoppingCartIngredientSerializer(ingredients, many=True).data
         )
-        shopping_cart_list = HttpResponse(
-            content_type='text/plain', charset="utf-8"
+
+    @action(detail=False, permission_classes=(IsAuthenticated,),
+            renderer_classes=(PlainTextRenderer, CSVRenderer, JSONRenderer))
+    def download_shopping_cart(self, request):
+        renderer = request.accepted_renderer
+        file_format = renderer.format
+        ingredients = get_shopping_cart_ingredients(request.user)
+        shopping_cart_list = StreamingHttpResponse(
+            SHOPPING_CART_STREAMS[file_format](ingredients),
+            content_type=f'{renderer.media_type}; charset=utf-8'
         )
         shopping_cart_list['Content-Disposition'] = (
-            'attachment; filename="Shopping_cart.txt"'
+            f'attachment; filename="Shopping_cart.{file_format}"'
         )
-
-        for ingredient, measurement_unit, amount in ingredients:
-            shopping_cart_list.write(
-                f'{ingredient} ({measurement_unit}) - {amount}\n'
-            )
         return shopping_cart_list
@@ -1,6 +1,10 @@
 from django.contrib import admin
 from django.contrib.auth import get_user_model
+from django.db import transaction
 
+from . import cart_totals
+from .search import update_search_index
+from .similarity import similar_recipes
 from .models import (
     Recipe,
     Ingredient,
@@ -8,7 +12,8 @@ from .models import (
     Favorite,
     ShoppingCart,
     RecipeIngredient,
-    RecipeTag
+    RecipeTag,
+    ShoppingCartIngredient
 )
 
 
@@ -37,7 +42,8 @@ class RecipeAdmin(admin.ModelAdmin):
     list_display = (
         'name',
         'author',
-        'favorites'
+        'favorites',
+        'in_carts_count'
     )
     list_filter = (
         'author',
@@ -45,9 +51,25 @@ class RecipeAdmin(admin.ModelAdmin):
         'tags'
     )
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        recipe_id = form.instance.pk
+        update_search_index((recipe_id,))
+        transaction.on_commit(
+            lambda: similar_recipes.schedule_update(recipe_id)
+        )
+        if change:
+            cart_totals.rebuild(
+                ShoppingCartIngredient,
+                RecipeIngredient,
+                user_ids=list(form.instance.shoppingcart.values_list(
+                    'user_id', flat=True
+                ))
+            )
+
     @admin.display(description="В избранном")
     def favorites(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
 
 
 class IngredientAdmin(admin.ModelAdmin):
@@ -0,0 +1,110 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+
+from .models import RecipeIngredient, ShoppingCart, ShoppingCartIngredient
+
+
+User = get_user_model()
+
+
+def get_recipes_amounts(recipe_ids, sign=1):
+    return {
+        ingredient_id: amount * sign
+        for ingredient_id, amount in RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).order_by().values_list('ingredient_id').annotate(
+            total_amount=Sum('amount')
+        )
+    }
+
+
+def lock_users(user_ids):
+    """Locks the users rows until the end of the transaction."""
+    list(User.objects.select_for_update().filter(
+        pk__in=user_ids
+    ).order_by('pk').values_list('pk', flat=True))
+
+
+def apply_deltas(user_ids, deltas):
+    """Adds ``{ingredient_id: amount}`` to the cart totals of every user.
+
+    Must run inside a transaction: the users rows are locked so that
+    concurrent changes of the same cart are applied one after another.
+    """
+    user_ids = list(user_ids)
+    deltas = {
+        ingredient_id: delta
+        for ingredient_id, delta in deltas.items() if delta
+    }
+    if not user_ids or not deltas:
+        return
+    lock_users(user_ids)
+    totals = ShoppingCartIngredient.objects.filter(
+        user_id__in=user_ids, ingredient_id__in=deltas
+    )
+    existing = set(totals.values_list('user_id', 'ingredient_id'))
+    if existing:
+        totals.update(total_amount=F('total_amount') + Case(
+            *(
+                When(ingredient_id=ingredient_id, then=Value(delta))
+                for ingredient_id, delta in deltas.items()
+            ),
+            default=Value(0),
+            output_field=IntegerField()
+        ))
+    ShoppingCartIngredient.objects.bulk_create(
+        ShoppingCartIngredient(
+            user_id=user_id, ingredient_id=ingredient_id, total_amount=delta
+        )
+        for user_id in user_ids
+        for ingredient_id, delta in deltas.items()
+        if delta > 0 and (user_id, ingredient_id) not in existing
+    )
+    if any(delta < 0 for delta in deltas.values()):
+        totals.filter(total_amount__lte=0).delete()
+
+
+def add_recipes(user_id, recipe_ids):
+    apply_deltas((user_id,), get_recipes_amounts(recipe_ids))
+
+
+def remove_recipes(user_id, recipe_ids):
+    apply_deltas((user_id,), get_recipes_amounts(recipe_ids, -1))
+
+
+def change_recipe(recipe_id, deltas):
+    apply_deltas(
+        ShoppingCart.objects.filter(
+            recipe_id=recipe_id
+        ).values_list('user_id', flat=True),
+        deltas
+    )
+
+
+def rebuild(ShoppingCartIngredient, RecipeIngredient, user_ids=None):
+    """Recomputes cart totals from scratch, for all or the given users."""
+    totals = ShoppingCartIngredient.objects.all()
+    recipe_ingredients = RecipeIngredient.objects.filter(
+        recipe__shoppingcart__isnull=False
+    )
+    if user_ids is not None:
+        totals = totals.filter(user_id__in=user_ids)
+        recipe_ingredients = RecipeIngredient.objects.filter(
+            recipe__shoppingcart__user_id__in=user_ids
+        )
+    totals.delete()
+    ShoppingCartIngredient.objects.bulk_create(
+        (
+            ShoppingCartIngredient(
+                user_id=user_id,
+                ingredient_id=ingredient_id,
+                total_amount=total_amount
+            )
+            for user_id, ingredient_id, total_amount in (
+                recipe_ingredients.order_by().values_list(
+                    'recipe__shoppingcart__user_id', 'ingredient_id'
+                ).annotate(total_amount=Sum('amount')).iterator()
+            )
+        ),
+        batch_size=1000
+    )
@@ -0,0 +1,38 @@
+from contextvars import ContextVar
+
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Recipe
+
+
+# Set while a bulk change shifts the counters and cart totals itself,
+# so the delete signals of its rows leave them alone.
+bulk_change = ContextVar('bulk_change', default=False)
+
+
+def count_subquery(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def recount(Recipe, Favorite, ShoppingCart, User, Follow):
+    """Recomputes all denormalized counters with one UPDATE per table."""
+    Recipe.objects.update(
+        favorites_count=count_subquery(Favorite, 'recipe'),
+        in_carts_count=count_subquery(ShoppingCart, 'recipe')
+    )
+    User.objects.update(
+        recipes_count=count_subquery(Recipe, 'author'),
+        followers_count=count_subquery(Follow, 'followed_user')
+    )
+
+
+def change_recipe_counter(model, recipe_ids, delta):
+    """Shifts the favorites or cart counter of recipes by ``delta``."""
+    Recipe.objects.filter(pk__in=recipe_ids).update(
+        **{model.counter_field: Greatest(F(model.counter_field) + delta, 0)}
+    )
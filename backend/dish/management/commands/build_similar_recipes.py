@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from dish.similarity import similar_recipes
+
+
+class Command(BaseCommand):
+    help = 'precomputes similar recipes by ingredient and tag overlap'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--count', type=int, help='neighbours kept per recipe'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        total = similar_recipes.build(options['count'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Computed similar recipes of {total} recipes in '
+            f'{time.monotonic() - started:.1f}s.'
+        ))
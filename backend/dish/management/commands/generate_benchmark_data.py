@@ -0,0 +1,216 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+
+from dish import cart_totals
+from dish.counters import recount
+from dish.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    RecipeTag,
+    ShoppingCart,
+    ShoppingCartIngredient,
+    Tag
+)
+from dish.search import update_search_index
+from users.models import Follow
+
+
+User = get_user_model()
+
+SCALES = {
+    'small': 10_000,
+    'medium': 100_000,
+    'large': 1_000_000,
+}
+PLACEHOLDER_IMAGE = 'benchmark/placeholder.png'
+PLACEHOLDER_PNG = bytes.fromhex(
+    '89504e470d0a1a0a0000000d49484452000000010000000108060000001f15c4'
+    '890000000d4944415478da63f8ffff3f0005fe02fea7d6a4b50000000049454e'
+    '44ae426082'
+)
+
+
+def next_id(model):
+    return (model.objects.aggregate(max_id=Max('id'))['max_id'] or 0) + 1
+
+
+class Command(BaseCommand):
+    help = 'generates synthetic users, recipes and relations for benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=SCALES, default='small')
+        parser.add_argument(
+            '--recipes', type=int, help='number of recipes, overrides scale'
+        )
+        parser.add_argument('--recipes-per-user', type=int, default=10)
+        parser.add_argument('--follows-per-user', type=int, default=20)
+        parser.add_argument('--favorites-per-user', type=int, default=20)
+        parser.add_argument('--cart-per-user', type=int, default=5)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        recipes_total = options['recipes'] or SCALES[options['scale']]
+        users_total = max(recipes_total // options['recipes_per_user'], 2)
+        started = time.monotonic()
+
+        tag_ids = self.ensure_tags()
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        if not ingredient_ids:
+            raise CommandError(
+                'No ingredients found, run load_ingredients_data first.'
+            )
+        if not default_storage.exists(PLACEHOLDER_IMAGE):
+            default_storage.save(
+                PLACEHOLDER_IMAGE, ContentFile(PLACEHOLDER_PNG)
+            )
+
+        with transaction.atomic():
+            user_ids = self.create_users(users_total)
+            recipe_ids = self.create_recipes(
+                recipes_total, user_ids, tag_ids, ingredient_ids,
+                options['ingredients_per_recipe']
+            )
+            self.create_follows(user_ids, options['follows_per_user'])
+            self.create_user_recipes(
+                Favorite, user_ids, recipe_ids, options['favorites_per_user']
+            )
+            self.create_user_recipes(
+                ShoppingCart, user_ids, recipe_ids, options['cart_per_user']
+            )
+            self.rebuild_cart_totals(user_ids)
+            self.reset_sequences()
+            update_search_index()
+            # The counters are kept by signals that bulk_create skips.
+            recount(Recipe, Favorite, ShoppingCart, User, Follow)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {len(user_ids)} users and {len(recipe_ids)} recipes '
+            f'in {time.monotonic() - started:.1f}s.'
+        ))
+
+    def bulk_create(self, model, objects):
+        model.objects.bulk_create(objects, batch_size=self.batch_size)
+
+    def ensure_tags(self):
+        for slug, color in (
+            ('breakfast', '#E26C2D'),
+            ('lunch', '#49B64E'),
+            ('dinner', '#8775D2')
+        ):
+            Tag.objects.get_or_create(
+                slug=slug, defaults={'name': slug, 'color': color}
+            )
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def create_users(self, total):
+        first_id = next_id(User)
+        password = make_password('benchmark')
+        user_ids = list(range(first_id, first_id + total))
+        self.bulk_create(User, (
+            User(
+                id=user_id,
+                email=f'bench{user_id}@example.com',
+                username=f'bench{user_id}',
+                first_name='Bench',
+                last_name=str(user_id),
+                password=password
+            ) for user_id in user_ids
+        ))
+        return user_ids
+
+    def create_recipes(self, total, user_ids, tag_ids, ingredient_ids,
+                       ingredients_per_recipe):
+        first_id = next_id(Recipe)
+        recipe_ids = list(range(first_id, first_id + total))
+        for start in range(0, total, self.batch_size):
+            chunk = recipe_ids[start:start + self.batch_size]
+            self.bulk_create(Recipe, (
+                Recipe(
+                    id=recipe_id,
+                    author_id=self.random.choice(user_ids),
+                    name=f'Рецепт {recipe_id}',
+                    text=f'Описание рецепта {recipe_id}',
+                    image=PLACEHOLDER_IMAGE,
+                    cooking_time=self.random.randint(5, 180)
+                ) for recipe_id in chunk
+            ))
+            self.bulk_create(RecipeTag, (
+                RecipeTag(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id in chunk
+                for tag_id in self.random.sample(
+                    tag_ids, self.random.randint(1, len(tag_ids))
+                )
+            ))
+            self.bulk_create(RecipeIngredient, (
+                RecipeIngredient(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=self.random.randint(1, 500)
+                )
+                for recipe_id in chunk
+                for ingredient_id in self.random.sample(
+                    ingredient_ids,
+                    min(ingredients_per_recipe, len(ingredient_ids))
+                )
+            ))
+        return recipe_ids
+
+    def create_follows(self, user_ids, per_user):
+        per_user = min(per_user, len(user_ids) - 1)
+        objects = []
+        for user_id in user_ids:
+            followed = set(self.random.sample(user_ids, per_user + 1))
+            followed.discard(user_id)
+            objects.extend(
+                Follow(user_id=user_id, followed_user_id=followed_id)
+                for followed_id in list(followed)[:per_user]
+            )
+            if len(objects) >= self.batch_size:
+                self.bulk_create(Follow, objects)
+                objects = []
+        self.bulk_create(Follow, objects)
+
+    def create_user_recipes(self, model, user_ids, recipe_ids, per_user):
+        per_user = min(per_user, len(recipe_ids))
+        objects = []
+        for user_id in user_ids:
+            objects.extend(
+                model(user_id=user_id, recipe_id=recipe_id)
+                for recipe_id in self.random.sample(recipe_ids, per_user)
+            )
+            if len(objects) >= self.batch_size:
+                self.bulk_create(model, objects)
+                objects = []
+        self.bulk_create(model, objects)
+
+    def rebuild_cart_totals(self, user_ids):
+        # bulk_create skips the signals that keep the totals.
+        for start in range(0, len(user_ids), self.batch_size):
+            cart_totals.rebuild(
+                ShoppingCartIngredient,
+                RecipeIngredient,
+                user_ids=user_ids[start:start + self.batch_size]
+            )
+
+    def reset_sequences(self):
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), (User, Recipe)
+        )
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
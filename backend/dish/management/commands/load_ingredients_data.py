@@ -1,21 +1,111 @@
 import csv
+import io
+import json
+import os
+import time
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 
+from api.cache import bump_version
 from dish.models import Ingredient
 
 
+DEFAULT_FILE = 'data/ingredients.csv'
+
+
+def read_csv(path):
+    with open(path, newline='', encoding='utf-8') as csv_file:
+        for row in csv.reader(csv_file, delimiter=','):
+            if len(row) >= 2:
+                yield row[0], row[1]
+
+
+def read_json(path):
+    with open(path, encoding='utf-8') as json_file:
+        for item in json.load(json_file):
+            yield item['name'], item['measurement_unit']
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
+
+
 class Command(BaseCommand):
-    help = 'loads ingredients data from csv file'
+    help = 'loads ingredients data from csv or json files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='*', default=(DEFAULT_FILE,),
+            help='csv (name,measurement_unit) or json files'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def read_rows(self, paths):
+        rows = {}
+        for path in paths:
+            reader = READERS.get(os.path.splitext(path)[1].lower())
+            if reader is None:
+                raise CommandError(f'Unsupported file format: {path}')
+            if not os.path.exists(path):
+                raise CommandError(f'File not found: {path}')
+            for name, measurement_unit in reader(path):
+                name = name.strip()
+                measurement_unit = measurement_unit.strip()
+                if name and measurement_unit:
+                    rows[(name, measurement_unit)] = None
+        return list(rows)
+
+    def copy_rows(self, rows):
+        table = Ingredient._meta.db_table
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE ingredients_load '
+                '(name varchar(200), measurement_unit varchar(200)) '
+                'ON COMMIT DROP'
+            )
+            cursor.cursor.copy_expert(
+                'COPY ingredients_load FROM STDIN WITH (FORMAT csv)', buffer
+            )
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT l.name, l.measurement_unit FROM ingredients_load l '
+                f'WHERE NOT EXISTS (SELECT 1 FROM {table} i '
+                'WHERE i.name = l.name '
+                'AND i.measurement_unit = l.measurement_unit)'
+            )
+            return cursor.rowcount
+
+    def create_rows(self, rows, batch_size):
+        existing = set(
+            Ingredient.objects.values_list('name', 'measurement_unit')
+        )
+        new_ingredients = [
+            Ingredient(name=name, measurement_unit=measurement_unit)
+            for name, measurement_unit in rows
+            if (name, measurement_unit) not in existing
+        ]
+        Ingredient.objects.bulk_create(
+            new_ingredients, batch_size=batch_size
+        )
+        return len(new_ingredients)
 
     def handle(self, *args, **options):
-        file = 'data/ingredients.csv'
-        with open(file, newline='', encoding='utf-8') as csv_file:
-            csv_reader = csv.reader(csv_file, delimiter=',')
-            for row in csv_reader:
-                name = row[0]
-                measurement_unit = row[1]
-                ingredient = Ingredient(
-                    name=name, measurement_unit=measurement_unit
-                )
-                ingredient.save()
+        started = time.monotonic()
+        rows = self.read_rows(options['paths'])
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                created = self.copy_rows(rows)
+            else:
+                created = self.create_rows(rows, options['batch_size'])
+        bump_version('ingredients')
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(self.style.SUCCESS(
+            f'Read {len(rows)} rows, created {created} ingredients '
+            f'in {elapsed:.2f}s ({len(rows) / elapsed:.0f} rows/sec).'
+        ))
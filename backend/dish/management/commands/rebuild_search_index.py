@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from dish.search import update_search_index
+
+
+class Command(BaseCommand):
+    help = 'rebuilds the full-text search index of recipes'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            update_search_index()
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt.'))
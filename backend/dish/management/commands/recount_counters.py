@@ -0,0 +1,29 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from dish import cart_totals
+from dish.counters import recount
+from dish.models import (
+    Favorite,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    ShoppingCartIngredient
+)
+from users.models import Follow
+
+
+class Command(BaseCommand):
+    help = (
+        'recomputes favorites, carts, recipes and followers counters '
+        'and shopping cart totals'
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            recount(
+                Recipe, Favorite, ShoppingCart, get_user_model(), Follow
+            )
+            cart_totals.rebuild(ShoppingCartIngredient, RecipeIngredient)
+        self.stdout.write(self.style.SUCCESS('Counters recomputed.'))
@@ -0,0 +1,42 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+INDEXES = (
+    (
+        'dish_ingredient_name_upper_pattern',
+        'CREATE INDEX IF NOT EXISTS dish_ingredient_name_upper_pattern '
+        'ON dish_ingredient (UPPER(name) text_pattern_ops)'
+    ),
+    (
+        'dish_ingredient_name_upper_trgm',
+        'CREATE INDEX IF NOT EXISTS dish_ingredient_name_upper_trgm '
+        'ON dish_ingredient USING gin (UPPER(name) gin_trgm_ops)'
+    ),
+)
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for _, sql in INDEXES:
+        schema_editor.execute(sql)
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _ in INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dish', '0001_initial'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.db import migrations, models
+
+from dish.counters import recount
+
+
+def recount_counters(apps, schema_editor):
+    recount(
+        apps.get_model('dish', 'Recipe'),
+        apps.get_model('dish', 'Favorite'),
+        apps.get_model('dish', 'ShoppingCart'),
+        apps.get_model(settings.AUTH_USER_MODEL),
+        apps.get_model('users', 'Follow'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dish', '0002_ingredient_name_search_indexes'),
+        ('users', '0002_customuser_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В списках покупок'),
+        ),
+        migrations.RunPython(recount_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+import django.contrib.postgres.search
+from django.db import migrations
+
+from dish.search import (
+    create_search_index,
+    drop_search_index,
+    update_search_index
+)
+
+
+def create_index(apps, schema_editor):
+    create_search_index(schema_editor)
+    update_search_index(using=schema_editor.connection)
+
+
+def drop_index(apps, schema_editor):
+    drop_search_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dish', '0004_shoppingcartingredient'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_index, drop_index),
+    ]
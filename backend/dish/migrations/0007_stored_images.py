@@ -0,0 +1,31 @@
+# Generated by Django 3.2.16 on 2026-10-18 18:59
+
+import dish.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dish', '0006_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Файл')),
+                ('references', models.PositiveIntegerField(default=1, verbose_name='Количество ссылок')),
+            ],
+            options={
+                'verbose_name': 'Сохраненное изображение',
+                'verbose_name_plural': 'Сохраненные изображения',
+            },
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(storage=dish.storage.ContentAddressedStorage(), upload_to='', verbose_name='Картинка'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-18 19:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dish', '0007_stored_images'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storedimage',
+            name='renditions_ready',
+            field=models.BooleanField(default=False, verbose_name='Уменьшенные копии готовы'),
+        ),
+    ]
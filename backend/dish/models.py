@@ -1,7 +1,11 @@
 from django.db import models
+from django.db.models import BooleanField, Exists, OuterRef, Prefetch, Value
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
 from colorfield.fields import ColorField
+from django.contrib.postgres.search import SearchVectorField
+
+from .storage import image_storage
 
 
 User = get_user_model()
@@ -63,6 +67,49 @@ class Ingredient(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+
+    def with_related(self, author=True, tags=True, ingredients=True):
+        queryset = self.defer('search_vector')
+        if author:
+            queryset = queryset.select_related('author')
+        if tags:
+            queryset = queryset.prefetch_related('tags')
+        if ingredients:
+            queryset = queryset.prefetch_related(Prefetch(
+                'recipeingredients',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'
+                ).order_by('ingredient__name', 'id')
+            ))
+        return queryset
+
+    def with_user_flags(self, user):
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField())
+            )
+        return self.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(user=user, recipe=OuterRef('pk'))
+            )
+        )
+
+    def with_renditions_ready(self):
+        return self.annotate(renditions_ready=Exists(
+            StoredImage.objects.filter(
+                name=OuterRef('image'), renditions_ready=True
+            )
+        ))
+
+    def followed_by(self, user):
+        return self.filter(author__following_users__user=user)
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         User,
@@ -76,7 +123,8 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         'Картинка',
-        blank=False
+        blank=False,
+        storage=image_storage
     )
     text = models.TextField(
         'Текстовое описание',
@@ -102,12 +150,35 @@ class Recipe(models.Model):
         db_index=True,
         verbose_name='Дата публикации'
     )
+    favorites_count = models.PositiveIntegerField(
+        'В избранном',
+        default=0,
+        editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'В списках покупок',
+        default=0,
+        editable=False
+    )
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         default_related_name = 'recipes'
         ordering = ('-created',)
+        indexes = [
+            models.Index(
+                fields=('-created', '-id'),
+                name='recipe_created_id_idx'
+            ),
+            models.Index(
+                fields=('author', '-created', '-id'),
+                name='recipe_author_created_id_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -158,6 +229,12 @@ class RecipeTag(models.Model):
                 fields=('tag', 'recipe'),
                 name='unique_recipe_tags')
         ]
+        indexes = [
+            models.Index(
+                fields=('recipe', 'tag'),
+                name='recipetag_recipe_tag_idx'
+            ),
+        ]
 
 
 class FavoriteAndShopingCartBaseModel(models.Model):
@@ -181,6 +258,7 @@ class FavoriteAndShopingCartBaseModel(models.Model):
 
 
 class Favorite(FavoriteAndShopingCartBaseModel):
+    counter_field = 'favorites_count'
 
     class Meta(FavoriteAndShopingCartBaseModel.Meta):
         verbose_name = 'Избранный рецепт'
@@ -189,8 +267,55 @@ class Favorite(FavoriteAndShopingCartBaseModel):
 
 
 class ShoppingCart(FavoriteAndShopingCartBaseModel):
+    counter_field = 'in_carts_count'
 
     class Meta(FavoriteAndShopingCartBaseModel.Meta):
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
         default_related_name = 'shoppingcart'
+
+
+class ShoppingCartIngredient(models.Model):
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient, on_delete=models.CASCADE,
+        verbose_name='Ингредиент'
+    )
+    total_amount = models.PositiveIntegerField('Количество')
+
+    class Meta:
+        verbose_name = 'Ингредиент списка покупок'
+        verbose_name_plural = 'Ингредиенты списков покупок'
+        default_related_name = 'shoppingcartingredients'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shoppingcart_ingredient'
+            )
+        ]
+
+
+class StoredImage(models.Model):
+    name = models.CharField(
+        'Файл',
+        max_length=100,
+        unique=True
+    )
+    references = models.PositiveIntegerField(
+        'Количество ссылок',
+        default=1
+    )
+    renditions_ready = models.BooleanField(
+        'Уменьшенные копии готовы',
+        default=False
+    )
+
+    class Meta:
+        verbose_name = 'Сохраненное изображение'
+        verbose_name_plural = 'Сохраненные изображения'
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,128 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import Exists, OuterRef, Q
+
+from .models import RecipeIngredient
+
+
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'dish_recipe_fts'
+WORD_RE = re.compile(r'\w+')
+
+POSTGRES_UPDATE = f"""
+    UPDATE dish_recipe SET search_vector =
+        setweight(to_tsvector('{SEARCH_CONFIG}', dish_recipe.name), 'A')
+        || setweight(to_tsvector('{SEARCH_CONFIG}', dish_recipe.text), 'B')
+        || setweight(to_tsvector('{SEARCH_CONFIG}', coalesce((
+            SELECT string_agg(i.name, ' ')
+            FROM dish_recipeingredient ri
+            JOIN dish_ingredient i ON i.id = ri.ingredient_id
+            WHERE ri.recipe_id = dish_recipe.id
+        ), '')), 'C')
+"""
+SQLITE_DELETE = f'DELETE FROM {FTS_TABLE}'
+SQLITE_INSERT = f"""
+    INSERT INTO {FTS_TABLE} (rowid, name, text, ingredients)
+    SELECT r.id, r.name, r.text, coalesce((
+        SELECT group_concat(i.name, ' ')
+        FROM dish_recipeingredient ri
+        JOIN dish_ingredient i ON i.id = ri.ingredient_id
+        WHERE ri.recipe_id = r.id
+    ), '')
+    FROM dish_recipe r
+"""
+
+
+def create_search_index(schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS dish_recipe_search_vector_gin '
+            'ON dish_recipe USING gin (search_vector)'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} '
+            'USING fts5(name, text, ingredients)'
+        )
+
+
+def drop_search_index(schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'DROP INDEX IF EXISTS dish_recipe_search_vector_gin'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def update_search_index(recipe_ids=None, using=connection):
+    """Reindexes the given recipes, or all of them when no ids are given."""
+    if recipe_ids is not None:
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return
+    params = recipe_ids or []
+    placeholders = ', '.join(['%s'] * len(params))
+    with using.cursor() as cursor:
+        if using.vendor == 'postgresql':
+            where = (
+                f' WHERE dish_recipe.id IN ({placeholders})'
+                if recipe_ids else ''
+            )
+            cursor.execute(POSTGRES_UPDATE + where, params)
+        elif using.vendor == 'sqlite':
+            delete_where = f' WHERE rowid IN ({placeholders})'
+            insert_where = f' WHERE r.id IN ({placeholders})'
+            if not recipe_ids:
+                delete_where = insert_where = ''
+            cursor.execute(SQLITE_DELETE + delete_where, params)
+            cursor.execute(SQLITE_INSERT + insert_where, params)
+
+
+def remove_from_search_index(recipe_id):
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', (recipe_id,)
+            )
+
+
+def get_fts_query(value):
+    return ' '.join(f'"{word}"*' for word in WORD_RE.findall(value))
+
+
+def search_recipes(queryset, value):
+    """Filters recipes by name, text and ingredient names, best first."""
+    if connection.vendor == 'postgresql':
+        query = SearchQuery(
+            value, config=SEARCH_CONFIG, search_type='websearch'
+        )
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank('search_vector', query)
+        ).order_by('-search_rank', '-created')
+    if connection.vendor == 'sqlite':
+        fts_query = get_fts_query(value)
+        if not fts_query:
+            return queryset
+        # A join reads rank once per match; a correlated rank subquery
+        # would run the full-text query again for every row.
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[
+                f'{FTS_TABLE}.rowid = dish_recipe.id',
+                f'{FTS_TABLE} MATCH %s'
+            ],
+            params=[fts_query],
+            select={'search_rank': f'-{FTS_TABLE}.rank'}
+        ).order_by('-search_rank', '-created')
+    return queryset.filter(
+        Q(name__icontains=value)
+        | Q(text__icontains=value)
+        | Exists(RecipeIngredient.objects.filter(
+            recipe=OuterRef('pk'), ingredient__name__icontains=value
+        ))
+    )
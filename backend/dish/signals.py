@@ -0,0 +1,77 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import cart_totals
+from .counters import bulk_change, change_recipe_counter
+from .models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart
+)
+from .search import remove_from_search_index, update_search_index
+from .similarity import similar_recipes
+
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def increment_recipe_counter(sender, instance, created, **kwargs):
+    if created:
+        change_recipe_counter(sender, (instance.recipe_id,), 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def decrement_recipe_counter(sender, instance, **kwargs):
+    if bulk_change.get():
+        return
+    change_recipe_counter(sender, (instance.recipe_id,), -1)
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(sender, instance, created, **kwargs):
+    if created:
+        User.objects.filter(pk=instance.author_id).update(
+            recipes_count=F('recipes_count') + 1
+        )
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(sender, instance, **kwargs):
+    User.objects.filter(pk=instance.author_id).update(
+        recipes_count=Greatest(F('recipes_count') - 1, 0)
+    )
+    remove_from_search_index(instance.pk)
+    recipe_id = instance.pk
+    transaction.on_commit(
+        lambda: similar_recipes.schedule_removal(recipe_id)
+    )
+
+
+@receiver(post_save, sender=Ingredient)
+def reindex_ingredient_recipes(sender, instance, created, **kwargs):
+    if not created:
+        update_search_index(RecipeIngredient.objects.filter(
+            ingredient=instance
+        ).values_list('recipe_id', flat=True))
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_recipe_to_cart_totals(sender, instance, created, **kwargs):
+    if created:
+        cart_totals.add_recipes(instance.user_id, (instance.recipe_id,))
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_recipe_from_cart_totals(sender, instance, **kwargs):
+    if bulk_change.get():
+        return
+    cart_totals.remove_recipes(instance.user_id, (instance.recipe_id,))
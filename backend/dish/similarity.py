@@ -0,0 +1,337 @@
+import fcntl
+import logging
+import mmap
+import os
+import struct
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from heapq import nlargest
+from threading import Lock
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count
+
+from .models import RecipeIngredient, RecipeTag
+
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'SIMR'
+HEADER = struct.Struct('<4sI')
+ROW_HEADER = struct.Struct('<I')
+NEIGHBOUR = struct.Struct('<If')
+CHUNK_SIZE = 10000
+TAG_WEIGHT = 0.25
+CANDIDATES_FACTOR = 5
+# Ingredients used by more recipes (salt, water) do not narrow the
+# candidates, they are still counted in the final score.
+MAX_POSTING = 10000
+
+executor = ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix='similar-recipes'
+)
+
+
+def jaccard(first, second):
+    common = len(first & second)
+    if not common:
+        return 0.0
+    return common / (len(first) + len(second) - common)
+
+
+def rank_neighbours(recipe_id, candidates, ingredients, tags, count):
+    """Best ``count`` candidates by ingredient and tag overlap."""
+    recipe_ingredients = ingredients[recipe_id]
+    recipe_tags = tags.get(recipe_id, set())
+    scores = (
+        (
+            jaccard(recipe_ingredients, ingredients[candidate])
+            + TAG_WEIGHT * jaccard(recipe_tags, tags.get(candidate, set())),
+            candidate
+        )
+        for candidate in candidates if candidate != recipe_id
+    )
+    return [
+        (candidate, score)
+        for score, candidate in nlargest(count, scores) if score > 0
+    ]
+
+
+def get_sets(queryset, field):
+    sets = defaultdict(set)
+    for recipe_id, value in queryset.values_list(
+        'recipe_id', field
+    ).order_by().iterator(chunk_size=CHUNK_SIZE):
+        sets[recipe_id].add(value)
+    return sets
+
+
+def compute_all(count):
+    """Yields neighbours of every recipe, computed in memory.
+
+    The inverted ingredient index plays the role of the sparse
+    recipe x ingredient product: candidates of a recipe are the recipes
+    sharing most of its ingredients.
+    """
+    ingredients = get_sets(RecipeIngredient.objects.all(), 'ingredient_id')
+    tags = get_sets(RecipeTag.objects.all(), 'tag_id')
+    postings = defaultdict(list)
+    for recipe_id, recipe_ingredients in ingredients.items():
+        for ingredient_id in recipe_ingredients:
+            postings[ingredient_id].append(recipe_id)
+    for recipe_id, recipe_ingredients in ingredients.items():
+        common = Counter()
+        for ingredient_id in recipe_ingredients:
+            posting = postings[ingredient_id]
+            if len(posting) <= MAX_POSTING:
+                common.update(posting)
+        candidates = [
+            candidate for candidate, _ in
+            common.most_common(count * CANDIDATES_FACTOR + 1)
+        ]
+        yield recipe_id, rank_neighbours(
+            recipe_id, candidates, ingredients, tags, count
+        )
+
+
+def compute_recipe(recipe_id, count):
+    """Neighbours of one recipe, computed with a few indexed queries."""
+    # Like in compute_all, ingredients of too many recipes are skipped;
+    # the sizes of all postings of the recipe come from one grouped
+    # query over the ingredient index.
+    ingredient_ids = [
+        ingredient_id for ingredient_id, posting in
+        RecipeIngredient.objects.filter(
+            ingredient__recipeingredients__recipe_id=recipe_id
+        ).values_list('ingredient_id').annotate(
+            posting=Count('id')
+        ).order_by()
+        if posting <= MAX_POSTING
+    ]
+    candidates = list(RecipeIngredient.objects.filter(
+        ingredient_id__in=ingredient_ids
+    ).exclude(recipe_id=recipe_id).values('recipe_id').annotate(
+        common=Count('id')
+    ).order_by('-common').values_list(
+        'recipe_id', flat=True
+    )[:count * CANDIDATES_FACTOR])
+    recipe_ids = candidates + [recipe_id]
+    ingredients = get_sets(
+        RecipeIngredient.objects.filter(recipe_id__in=recipe_ids),
+        'ingredient_id'
+    )
+    if recipe_id not in ingredients:
+        return []
+    tags = get_sets(
+        RecipeTag.objects.filter(recipe_id__in=recipe_ids), 'tag_id'
+    )
+    return rank_neighbours(recipe_id, candidates, ingredients, tags, count)
+
+
+def get_row_size(count):
+    return ROW_HEADER.size + count * NEIGHBOUR.size
+
+
+def get_row_offset(recipe_id, count):
+    return HEADER.size + recipe_id * get_row_size(count)
+
+
+def pack_row(neighbours, count):
+    """Packs a row; its header is the number of neighbours plus one, so
+    zeroed rows of recipes that were never computed stay distinguishable.
+    """
+    neighbours = neighbours[:count]
+    row = bytearray(get_row_size(count))
+    ROW_HEADER.pack_into(row, 0, len(neighbours) + 1)
+    for position, neighbour in enumerate(neighbours):
+        NEIGHBOUR.pack_into(
+            row, ROW_HEADER.size + position * NEIGHBOUR.size, *neighbour
+        )
+    return bytes(row)
+
+
+def unpack_row(data, offset, count):
+    if offset + get_row_size(count) > len(data):
+        return None
+    (length,) = ROW_HEADER.unpack_from(data, offset)
+    if not length:
+        return None
+    return [
+        NEIGHBOUR.unpack_from(
+            data, offset + ROW_HEADER.size + position * NEIGHBOUR.size
+        )
+        for position in range(min(length - 1, count))
+    ]
+
+
+class SimilarRecipes:
+    """Precomputed similar recipes in a memory-mapped file.
+
+    The file holds a fixed-size row per recipe id with up to ``count``
+    (recipe id, score) pairs, best first, so a lookup is a single
+    offset computation. The file is mapped once per worker and remapped
+    when the build command replaces it or an update grows it.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._key = None
+        self._map = None
+        self._count = None
+
+    @property
+    def path(self):
+        return str(settings.SIMILAR_RECIPES_FILE)
+
+    def _load(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None, None
+        if stat.st_size < HEADER.size:
+            return None, None
+        key = (stat.st_dev, stat.st_ino, stat.st_size)
+        with self._lock:
+            if self._key != key:
+                with open(self.path, 'rb') as file:
+                    data = mmap.mmap(
+                        file.fileno(), 0, access=mmap.ACCESS_READ
+                    )
+                magic, count = HEADER.unpack_from(data)
+                if magic != MAGIC:
+                    raise ValueError(f'{self.path} has an unknown format')
+                self._map, self._count, self._key = data, count, key
+            return self._map, self._count
+
+    def get(self, recipe_id):
+        """Neighbours of the recipe, None if they were never computed."""
+        data, count = self._load()
+        if data is None:
+            return None
+        return unpack_row(data, get_row_offset(recipe_id, count), count)
+
+    def build(self, count=None):
+        """Computes all rows into a new file and swaps it in atomically.
+
+        The update lock is held for the whole build, so rows written by
+        updates are neither lost with the replaced file nor overwritten
+        with older ones.
+        """
+        count = count or settings.SIMILAR_RECIPES_COUNT
+        temporary_path = f'{self.path}.tmp'
+        size = HEADER.size
+        total = 0
+        with self._locked():
+            with open(temporary_path, 'wb') as file:
+                file.write(HEADER.pack(MAGIC, count))
+                for recipe_id, neighbours in compute_all(count):
+                    offset = get_row_offset(recipe_id, count)
+                    file.seek(offset)
+                    file.write(pack_row(neighbours, count))
+                    size = max(size, offset + get_row_size(count))
+                    total += 1
+                file.truncate(size)
+            os.replace(temporary_path, self.path)
+        return total
+
+    def update_recipe(self, recipe_id):
+        """Recomputes the recipe row and offers the recipe to the rows of
+        its neighbours, so new recipes show up without a full rebuild.
+        """
+        _, count = self._load()
+        neighbours = compute_recipe(
+            recipe_id, count or settings.SIMILAR_RECIPES_COUNT
+        )
+        with self._locked(), self._open_for_update() as file:
+            count = self._read_count(file)
+            self._write_row(file, recipe_id, neighbours, count)
+            for neighbour_id, score in neighbours:
+                row = self._read_row(file, neighbour_id, count)
+                if row is None:
+                    continue
+                row = [item for item in row if item[0] != recipe_id]
+                if len(row) < count or score > row[-1][1]:
+                    row.append((recipe_id, score))
+                    row.sort(key=lambda item: item[1], reverse=True)
+                    self._write_row(file, neighbour_id, row, count)
+        return neighbours
+
+    def remove_recipe(self, recipe_id):
+        with self._locked():
+            if not os.path.exists(self.path):
+                return
+            with self._open_for_update() as file:
+                count = self._read_count(file)
+                offset = get_row_offset(recipe_id, count)
+                file.seek(0, os.SEEK_END)
+                if offset < file.tell():
+                    file.seek(offset)
+                    file.write(bytes(get_row_size(count)))
+
+    def schedule_update(self, recipe_id):
+        schedule(self.update_recipe, recipe_id)
+
+    def schedule_removal(self, recipe_id):
+        schedule(self.remove_recipe, recipe_id)
+
+    @contextmanager
+    def _locked(self):
+        """Exclusive lock shared by the build and the updates of all
+        processes; a separate file, because the build replaces the data
+        file.
+        """
+        with open(f'{self.path}.lock', 'ab') as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            yield
+
+    def _open_for_update(self):
+        if not os.path.exists(self.path):
+            with open(self.path, 'wb') as file:
+                file.write(HEADER.pack(
+                    MAGIC, settings.SIMILAR_RECIPES_COUNT
+                ))
+        return open(self.path, 'r+b')
+
+    def _read_count(self, file):
+        file.seek(0)
+        _, count = HEADER.unpack(file.read(HEADER.size))
+        return count
+
+    def _read_row(self, file, recipe_id, count):
+        offset = get_row_offset(recipe_id, count)
+        file.seek(offset)
+        data = file.read(get_row_size(count))
+        return unpack_row(data, 0, count)
+
+    def _write_row(self, file, recipe_id, neighbours, count):
+        file.seek(get_row_offset(recipe_id, count))
+        file.write(pack_row(neighbours, count))
+
+
+def run_update(method, recipe_id):
+    try:
+        method(recipe_id)
+    finally:
+        connections.close_all()
+
+
+def log_failure(future):
+    if future.exception() is not None:
+        logger.error(
+            'Similar recipes update failed', exc_info=future.exception()
+        )
+
+
+def schedule(method, recipe_id):
+    """Runs an update on the background thread of the process, so that
+    requests neither wait for the queries nor for a running build.
+    One thread keeps the updates in order.
+    """
+    executor.submit(run_update, method, recipe_id).add_done_callback(
+        log_failure
+    )
+
+
+similar_recipes = SimilarRecipes()
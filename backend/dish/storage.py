@@ -0,0 +1,92 @@
+import os
+from hashlib import sha256
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+
+IMAGES_DIR = 'images'
+
+
+def get_content_name(name, content):
+    """``images/<2 hex digits>/<sha256 of the bytes><extension>``."""
+    digest = sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    extension = os.path.splitext(name)[1].lower()
+    hexdigest = digest.hexdigest()
+    return f'{IMAGES_DIR}/{hexdigest[:2]}/{hexdigest}{extension}'
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Stores files under the hash of their content.
+
+    Identical uploads share one file, which is written only once, and
+    the files never change, so they can be cached forever. Every save
+    takes a reference in ``StoredImage`` and the file is deleted when
+    the last reference is released.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = get_content_name(name, content)
+        with transaction.atomic():
+            # The locked row keeps a concurrent release from deleting
+            # the file between the check and the save of the recipe.
+            self.retain(name)
+            if not self.exists(name):
+                self._write(name, content)
+        return name
+
+    def _write(self, name, content):
+        temporary_name = super()._save(f'{name}.tmp', content)
+        os.replace(self.path(temporary_name), self.path(name))
+
+    def retain(self, name):
+        from .models import StoredImage
+
+        image, created = StoredImage.objects.select_for_update(
+        ).get_or_create(name=name)
+        if not created:
+            StoredImage.objects.filter(pk=image.pk).update(
+                references=F('references') + 1
+            )
+
+    def release(self, name, delete=None):
+        """Drops a reference to the file; after commit the file is
+        deleted, with ``delete`` if given, once nothing refers to it.
+        Files saved by other storages have no references and are kept.
+        """
+        from .models import StoredImage
+
+        if not name or not StoredImage.objects.filter(
+            name=name, references__gt=0
+        ).update(references=F('references') - 1):
+            return
+        transaction.on_commit(
+            lambda: self.delete_unused(name, delete or self.delete)
+        )
+
+    def delete_unused(self, name, delete):
+        from .models import StoredImage
+
+        with transaction.atomic():
+            image = StoredImage.objects.select_for_update().filter(
+                name=name, references=0
+            ).first()
+            if image is None:
+                return
+            delete(name)
+            image.delete()
+
+
+image_storage = ContentAddressedStorage()
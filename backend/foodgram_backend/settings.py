@@ -1,5 +1,6 @@
 from dotenv import load_dotenv
 
+import json
 import os
 from pathlib import Path
 
@@ -32,6 +33,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.PerformanceMiddleware',
+    'api.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,6 +83,52 @@ else:
         }
     }
 
+if os.getenv('USE_SQLITE', False) == 'True':
+    REPLICA_SETTINGS = [
+        {'NAME': name}
+        for name in os.getenv('SQLITE_REPLICAS', '').split(',') if name
+    ]
+else:
+    REPLICA_SETTINGS = [
+        {'HOST': host}
+        for host in os.getenv('POSTGRES_REPLICA_HOSTS', '').split(',') if host
+    ]
+DATABASE_REPLICAS = []
+for number, replica in enumerate(REPLICA_SETTINGS):
+    alias = f'replica_{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        **replica,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 5))
+REPLICA_MAX_LAG = float(os.getenv('REPLICA_MAX_LAG', 10))
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv('REPLICA_LAG_CHECK_INTERVAL', 5))
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', BASE_DIR / 'cache'),
+    },
+    'tokens': {
+        'BACKEND': os.getenv(
+            'TOKEN_CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'
+        ),
+        'LOCATION': os.getenv('TOKEN_CACHE_LOCATION', BASE_DIR / 'cache' / 'tokens'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('TOKEN_CACHE_SIZE', 10000)),
+        },
+    },
+}
+TOKEN_CACHE_ALIAS = 'tokens'
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', 300))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -111,6 +160,14 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+IMAGE_MAX_UPLOAD_SIZE = int(os.getenv('IMAGE_MAX_UPLOAD_SIZE', 10 * 1024 * 1024))
+IMAGE_RENDITION_WORKERS = int(os.getenv('IMAGE_RENDITION_WORKERS', 2))
+IMAGE_RENDITION_QUEUE_SIZE = int(os.getenv('IMAGE_RENDITION_QUEUE_SIZE', 100))
+IMAGE_RENDITIONS = {
+    'list': (400, 400),
+    'detail': (1200, 1200),
+}
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.CustomUser'
@@ -120,13 +177,52 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
     'PAGE_SIZE': 6,
     'SEARCH_PARAM': 'name'
 }
 
+PERFORMANCE_SLOW_REQUEST_MS = int(os.getenv('PERFORMANCE_SLOW_REQUEST_MS', 500))
+# Recipe create and update take 20-32 queries.
+PERFORMANCE_SLOW_REQUEST_QUERIES = int(os.getenv('PERFORMANCE_SLOW_REQUEST_QUERIES', 50))
+# Per-route limits, keyed by the url name, the route label of the metrics,
+# e.g. {"recipe-list": 10}.
+PERFORMANCE_SLOW_ROUTE_QUERIES = json.loads(os.getenv('PERFORMANCE_SLOW_ROUTE_QUERIES', '{}'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'api': {
+            'handlers': ['console'],
+            'level': os.getenv('API_LOG_LEVEL', 'WARNING'),
+        },
+    },
+}
+
+INGREDIENT_INDEX_ENABLED = os.getenv('INGREDIENT_INDEX_ENABLED', 'True') == 'True'
+
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', 'False') == 'True'
+
+SIMILAR_RECIPES_FILE = os.getenv('SIMILAR_RECIPES_FILE', BASE_DIR / 'similar_recipes.bin')
+SIMILAR_RECIPES_COUNT = int(os.getenv('SIMILAR_RECIPES_COUNT', 20))
+
 DJOSER = {
     'SERIALIZERS': {
         'user': 'users.serializers.CustomUserSerializer',
@@ -0,0 +1,10 @@
+import os
+
+
+bind = '0.0.0.0:10000'
+
+if os.getenv('ASGI', 'False') == 'True':
+    worker_class = 'uvicorn.workers.UvicornWorker'
+    wsgi_app = 'foodgram_backend.asgi:application'
+else:
+    wsgi_app = 'foodgram_backend.wsgi:application'
@@ -5,6 +5,10 @@ from .models import CustomUser, Follow
 
 
 class CustomUserAdmin(UserAdmin):
+    list_display = UserAdmin.list_display + (
+        'recipes_count',
+        'followers_count'
+    )
     list_filter = ('email', 'username')
 
 
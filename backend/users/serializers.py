@@ -20,6 +20,8 @@ class CustomUserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, followed_user):
+        if hasattr(followed_user, 'is_subscribed'):
+            return followed_user.is_subscribed
         user = self.context.get('request').user
         if user.is_authenticated:
             return Follow.objects.filter(
@@ -30,7 +32,7 @@ class CustomUserSerializer(UserSerializer):
 
 class FollowSerializer(CustomUserSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(source='recipes.count')
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = User
@@ -39,9 +41,4 @@ class FollowSerializer(CustomUserSerializer):
         )
 
     def get_recipes(self, user):
-        request = self.context.get('request')
-        recipes_limit = request.query_params.get('recipes_limit')
-        recipes = user.recipes.all()
-        if recipes_limit and recipes_limit.isdigit():
-            recipes = recipes[:int(recipes_limit)]
-        return BaseRecipeSerializer(recipes, many=True).data
+        return BaseRecipeSerializer(user.limited_recipes, many=True).data
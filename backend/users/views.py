@@ -1,4 +1,13 @@
 from django.contrib.auth import get_user_model
+from django.db.models import (
+    BooleanField,
+    Exists,
+    F,
+    OuterRef,
+    Prefetch,
+    Subquery,
+    Value
+)
 from djoser.views import UserViewSet
 from rest_framework import exceptions, status
 from rest_framework.decorators import action
@@ -9,7 +18,8 @@ from rest_framework.permissions import (
 )
 from rest_framework.response import Response
 
-from api.pagination import LimitNumberPagination
+from api.pagination import LimitCursorPagination
+from dish.models import Recipe
 from .models import Follow
 from .serializers import FollowSerializer
 
@@ -17,12 +27,46 @@ from .serializers import FollowSerializer
 User = get_user_model()
 
 
+def with_recipes(queryset, request):
+    recipes = Recipe.objects.with_renditions_ready()
+    recipes_limit = request.query_params.get('recipes_limit')
+    if recipes_limit and recipes_limit.isdigit():
+        recipes = recipes.filter(id__in=Subquery(
+            Recipe.objects.filter(
+                author=OuterRef('author')
+            ).values('id')[:int(recipes_limit)]
+        ))
+    return queryset.prefetch_related(
+        Prefetch('recipes', queryset=recipes, to_attr='limited_recipes')
+    )
+
+
 class CustomUserViewSet(UserViewSet):
     permission_classes = (IsAuthenticatedOrReadOnly,)
+    cursor_field = 'subscribed'
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if user.is_authenticated:
+            return queryset.annotate(is_subscribed=Exists(
+                Follow.objects.filter(user=user, followed_user=OuterRef('pk'))
+            ))
+        return queryset
+
+    def get_instance(self):
+        # request.user may come from the token cache with stale counters.
+        return self.get_queryset().get(pk=self.request.user.pk)
 
-    @action(detail=False, pagination_class=LimitNumberPagination)
+    @action(detail=False, pagination_class=LimitCursorPagination)
     def subscriptions(self, request):
-        subscriptions = User.objects.filter(following_users__user=request.user)
+        subscriptions = with_recipes(
+            User.objects.filter(following_users__user=request.user),
+            request
+        ).annotate(
+            is_subscribed=Value(True, output_field=BooleanField()),
+            subscribed=F('following_users__created')
+        ).order_by('-subscribed', '-id')
         page = self.paginate_queryset(subscriptions)
         serializer = FollowSerializer(
             page, context={'request': request}, many=True
@@ -34,7 +78,7 @@ class CustomUserViewSet(UserViewSet):
         user = request.user
         followed_user = self.get_object()
         if request.method == 'POST':
-            if user == self.get_object():
+            if user == followed_user:
                 raise exceptions.ParseError(
                     detail='Нельзя подписаться на самого себя.'
                 )
@@ -46,7 +90,12 @@ class CustomUserViewSet(UserViewSet):
                     detail='Вы уже подписаны на этого пользователя.'
                 )
             serializer = FollowSerializer(
-                instance=followed_user, context={'request': request}
+                instance=with_recipes(
+                    User.objects.filter(pk=followed_user.pk), request
+                ).annotate(
+                    is_subscribed=Value(True, output_field=BooleanField())
+                ).get(),
+                context={'request': request}
             )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         try: